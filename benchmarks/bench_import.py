@@ -0,0 +1,183 @@
+"""Import and construction cost of jlrpy and the integration.
+
+Each import is timed in a fresh interpreter, so nothing is cached by an earlier
+round. Importing jlrpy must not touch logging nor load asyncio or aiohttp, and
+its median import time must stay within --tolerance of the jlrpy of the
+--baseline commit (the first commit of the repository by default), or within
+--budget milliseconds when git is not available. Connection (and, with aiohttp
+installed, AsyncConnection) construction is timed with sockets disabled, so any
+network I/O during construction fails the benchmark. The integration import is
+skipped when Home Assistant is not installed. Exits with 1 on a regression.
+
+    python benchmarks/bench_import.py [--rounds 10] [--constructions 1000]
+        [--baseline REV] [--tolerance 0.1] [--budget 100]
+"""
+import argparse
+import importlib.util
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPONENT = os.path.join(ROOT, "custom_components", "jlrincontrol")
+JLRPY = "custom_components/jlrincontrol/jlrpy.py"
+
+# Run in the child interpreter: time the import, check it left logging alone
+IMPORT_SCRIPT = """
+import logging, sys, time
+sys.path.insert(0, {path!r})
+before = (logging.getLogger().level, logging.getLogger("jply").level)
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+jply = logging.getLogger("jply")
+# A NullHandler is the library convention and outputs nothing
+handlers = [h for h in jply.handlers if not isinstance(h, logging.NullHandler)]
+if {check_logging}:
+    assert not handlers, "importing added output handlers to the jply logger"
+    levels = (logging.getLogger().level, jply.level)
+    assert levels == before, "importing set log levels"
+print(elapsed)
+print(" ".join(m for m in ("asyncio", "aiohttp") if m in sys.modules))
+"""
+
+
+def time_import(module, path, rounds, check_logging=True):
+    """Return (import times in ms, modules loaded that should not be), or None.
+
+    None means the module cannot be imported here. The baseline jlrpy predates
+    the logging checks, check_logging=False skips them.
+    """
+    script = IMPORT_SCRIPT.format(
+        module=module, path=path, check_logging=check_logging
+    )
+    times = []
+    for _ in range(rounds):
+        result = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True
+        )
+        if result.returncode:
+            if "ModuleNotFoundError" in result.stderr:
+                return None
+            raise RuntimeError(result.stderr)
+        elapsed, loaded = (result.stdout.splitlines() + [""])[:2]
+        times.append(float(elapsed) * 1000)
+    return times, loaded.split()
+
+
+def baseline_jlrpy(revision, directory):
+    """Write the jlrpy of a git revision to directory, return False without git."""
+    if revision is None:
+        result = subprocess.run(
+            ["git", "-C", ROOT, "rev-list", "--max-parents=0", "HEAD"],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            return False
+        revision = result.stdout.split()[0]
+    result = subprocess.run(
+        ["git", "-C", ROOT, "show", f"{revision}:{JLRPY}"], capture_output=True
+    )
+    if result.returncode:
+        return False
+    with open(os.path.join(directory, "jlrpy.py"), "wb") as file:
+        file.write(result.stdout)
+    # Compile up front, so the first round does not pay for it
+    subprocess.run([sys.executable, "-m", "compileall", "-q", directory], check=True)
+    return True
+
+
+class NoNetwork:
+    """Make every attempt to open a connection raise while active."""
+
+    def _refuse(self, *args, **kwargs):
+        raise AssertionError("network I/O during construction")
+
+    def __enter__(self):
+        """Replace the socket functions that open connections."""
+        self._saved = socket.create_connection, socket.socket.connect
+        socket.create_connection = socket.socket.connect = self._refuse
+        return self
+
+    def __exit__(self, *exc):
+        """Restore the socket functions."""
+        socket.create_connection, socket.socket.connect = self._saved
+
+
+def time_construction(factory, count):
+    """Return the mean construction time of factory() in microseconds."""
+    with NoNetwork():
+        factory()
+        start = time.perf_counter()
+        for _ in range(count):
+            factory()
+        return (time.perf_counter() - start) / count * 1e6
+
+
+def report(name, measured):
+    """Print the distribution of the import times of one module."""
+    if measured is None:
+        print(f"import {name:<20} skipped, dependencies not installed")
+        return
+    times = measured[0]
+    print(
+        f"import {name:<20} mean {statistics.mean(times):7.2f} ms"
+        f"  median {statistics.median(times):7.2f} ms  min {min(times):7.2f} ms"
+    )
+
+
+def main():
+    """Time the imports and constructions and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--constructions", type=int, default=1000)
+    parser.add_argument("--baseline", help="git revision to compare jlrpy with")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--budget", type=float, default=100, help="ms without git")
+    args = parser.parse_args()
+
+    # Compile up front, so the first round does not pay for it
+    subprocess.run([sys.executable, "-m", "compileall", "-q", COMPONENT], check=True)
+    failures = []
+    current = time_import("jlrpy", COMPONENT, args.rounds)
+    report("jlrpy", current)
+    if current[1]:
+        failures.append(f"importing jlrpy loads {', '.join(current[1])}")
+    with tempfile.TemporaryDirectory() as directory:
+        if baseline_jlrpy(args.baseline, directory):
+            baseline = time_import("jlrpy", directory, args.rounds, False)
+            report("jlrpy (baseline)", baseline)
+            limit = statistics.median(baseline[0]) * (1 + args.tolerance)
+        else:
+            limit = args.budget
+    if statistics.median(current[0]) > limit:
+        failures.append(f"importing jlrpy takes longer than {limit:.2f} ms")
+    report(
+        "jlrincontrol",
+        time_import("custom_components.jlrincontrol", ROOT, args.rounds),
+    )
+
+    sys.path.insert(0, COMPONENT)
+    import jlrpy  # pylint: disable=import-outside-toplevel
+
+    factories = {"Connection": lambda: jlrpy.Connection("bench@example.com", "x")}
+    if importlib.util.find_spec("aiohttp") is not None:
+        factories["AsyncConnection"] = lambda: jlrpy.AsyncConnection(
+            "bench@example.com", "x"
+        )
+    for name, factory in factories.items():
+        micros = time_construction(factory, args.constructions)
+        print(f"construct {name:<17} mean {micros:7.2f} us, no network I/O")
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Per-request latency of the pooled jlrpy transport against a local HTTPS stand-in.
+
+Compares HTTPConnectionPool, which reuses keep-alive connections, with a fresh
+urllib opener per request (the transport jlrpy used before pooling), which pays
+a TCP and TLS handshake every time. The stand-in is a threaded HTTP/1.1 server on
+localhost with a throwaway self-signed certificate (needs the openssl CLI).
+
+    python benchmarks/bench_pool.py [--requests 500] [--threads 4]
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import http.server
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.request import HTTPSHandler, Request, build_opener
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPONENT = os.path.join(ROOT, "custom_components", "jlrincontrol")
+sys.path.insert(0, COMPONENT)
+import jlrpy  # noqa: E402 pylint: disable=wrong-import-position
+
+BODY = b'{"status": "ok"}'
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Answer every request with a small JSON body, keeping the connection open."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in two writes; with Nagle's algorithm the body
+    # waits for the client's delayed ACK on every reused connection
+    disable_nagle_algorithm = True
+
+    def _respond(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    do_GET = do_POST = _respond
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Keep the benchmark output clean."""
+
+
+def make_certificate(directory):
+    """Create a self-signed certificate for localhost and return (cert, key)."""
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        # fmt: off
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost",
+            "-days", "1", "-keyout", key, "-out", cert,
+        ],
+        # fmt: on
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+def start_server(cert, key):
+    """Serve HTTPS on a free localhost port from a daemon thread."""
+    server = http.server.ThreadingHTTPServer(("localhost", 0), Handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(send, requests, threads):
+    """Return the latency of every request in milliseconds."""
+
+    def timed(_):
+        start = time.perf_counter()
+        send()
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(threads) as executor:
+        return list(executor.map(timed, range(requests)))
+
+
+def report(name, latencies):
+    """Print the latency distribution of one transport."""
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:<10} mean {statistics.mean(latencies):7.2f} ms"
+        f"  median {statistics.median(latencies):7.2f} ms  p95 {p95:7.2f} ms"
+    )
+
+
+def main():
+    """Run both transports against the stand-in and print their latencies."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = make_certificate(directory)
+        server = start_server(cert, key)
+        url = f"https://localhost:{server.server_address[1]}/vehicles"
+        client_context = ssl.create_default_context(cafile=cert)
+
+        pool = jlrpy.HTTPConnectionPool(
+            maxsize=args.threads, ssl_context=client_context
+        )
+
+        def pooled():
+            pool.request("GET", url, headers={"Accept": "application/json"})
+
+        def unpooled():
+            opener = build_opener(HTTPSHandler(context=client_context))
+            opener.open(Request(url, headers={"Accept": "application/json"})).read()
+
+        # Warm up: imports, the first handshakes and the server threads
+        measure(pooled, args.threads, args.threads)
+        measure(unpooled, args.threads, args.threads)
+
+        print(f"{args.requests} GET requests from {args.threads} threads")
+        report("unpooled", measure(unpooled, args.requests, args.threads))
+        report("pooled", measure(pooled, args.requests, args.threads))
+        pool.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
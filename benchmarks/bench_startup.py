@@ -0,0 +1,160 @@
+"""Startup time of the integration for an account with many vehicles.
+
+Runs async_setup against a stubbed hass: login, the vehicle list and polling are
+replaced so no request leaves the machine, storage starts empty, and every
+platform is set up in place with add_entities/async_see only counting. The time
+covers async_setup, async_discover and the setup of every platform. Needs Home
+Assistant installed.
+
+    python benchmarks/bench_startup.py [--vehicles 20] [--rounds 20]
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+from custom_components import jlrincontrol  # noqa: E402
+from custom_components.jlrincontrol import jlrpy  # noqa: E402
+
+
+class StubHass:
+    """Just enough of HomeAssistant for async_setup and the platforms."""
+
+    def __init__(self, loop):
+        """Initialize with empty data and a task list to wait for."""
+        self.loop = loop
+        self.data = {}
+        self.config = SimpleNamespace(path=lambda *parts: os.devnull)
+        self.bus = SimpleNamespace(async_listen_once=lambda event, listener: None)
+        self.tasks = []
+
+    def async_create_task(self, coro):
+        """Schedule a coroutine and remember it."""
+        task = self.loop.create_task(coro)
+        self.tasks.append(task)
+        return task
+
+    def async_add_executor_job(self, target, *args):
+        """Run a job in the default executor."""
+        return self.loop.run_in_executor(None, target, *args)
+
+
+class Counter:
+    """Count platform loads, add_entities calls and entities."""
+
+    def __init__(self):
+        """Initialize the counts."""
+        self.platforms = 0
+        self.batches = 0
+        self.entities = 0
+
+    def add_entities(self, entities, update_before_add=False):
+        """Stand in for the add_entities callback of a platform."""
+        self.batches += 1
+        self.entities += len(entities)
+
+    async def async_see(self, **kwargs):
+        """Stand in for the async_see callback of device_tracker."""
+
+    async def async_load_platform(self, hass, component, domain, info, config):
+        """Set up a platform of the integration in place, as discovery would."""
+        self.platforms += 1
+        platform = importlib.import_module(f"{jlrincontrol.__name__}.{component}")
+        if component == "device_tracker":
+            await platform.async_setup_scanner(hass, config, self.async_see, info)
+        else:
+            platform.setup_platform(hass, config, self.add_entities, info)
+
+
+def make_vehicles(count):
+    """Return fake vehicle list entries for count vehicles."""
+    return [
+        {"vin": f"SADHA2B1{index:09d}", "role": "Primary"}
+        for index in range(count)
+    ]
+
+
+async def setup_once(vehicles):
+    """Run async_setup for the vehicles and return (seconds, counter)."""
+    loop = asyncio.get_running_loop()
+    hass = StubHass(loop)
+    counter = Counter()
+    config = jlrincontrol.CONFIG_SCHEMA(
+        {jlrincontrol.DOMAIN: {"username": "bench@example.com", "password": "x"}}
+    )
+
+    async def load_vehicles(connection):
+        connection.vehicles = [jlrpy.AsyncVehicle(v, connection) for v in vehicles]
+        return connection.vehicles
+
+    async def nothing(*args, **kwargs):
+        return None
+
+    async def no_snapshots(*args, **kwargs):
+        return {}
+
+    patches = [
+        mock.patch.object(jlrincontrol, "async_get_clientsession"),
+        mock.patch.object(jlrincontrol, "async_track_time_interval"),
+        mock.patch.object(
+            jlrincontrol, "async_load_platform", counter.async_load_platform
+        ),
+        mock.patch.object(jlrincontrol.AuthStore, "async_load", nothing),
+        mock.patch.object(jlrincontrol.SnapshotStore, "async_load", no_snapshots),
+        mock.patch.object(jlrpy.AsyncConnection, "connect", nothing),
+        mock.patch.object(jlrpy.AsyncConnection, "load_vehicles", load_vehicles),
+        mock.patch.object(jlrincontrol.JLRData, "async_update", nothing),
+    ]
+    for patch in patches:
+        patch.start()
+    try:
+        start = time.perf_counter()
+        await jlrincontrol.async_setup(hass, config)
+        # Discovery runs from tasks, which may schedule more tasks
+        while not all(task.done() for task in hass.tasks):
+            await asyncio.gather(*hass.tasks)
+        elapsed = time.perf_counter() - start
+    finally:
+        for patch in patches:
+            patch.stop()
+    return elapsed, counter
+
+
+def main():
+    """Time the startup and print the distribution and the setup counts."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vehicles", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    vehicles = make_vehicles(args.vehicles)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(setup_once(vehicles))  # warm up imports and caches
+    times = []
+    for _ in range(args.rounds):
+        elapsed, counter = loop.run_until_complete(setup_once(vehicles))
+        times.append(elapsed * 1000)
+    loop.close()
+
+    print(
+        f"{args.vehicles} vehicles: {counter.platforms} platform loads, "
+        f"{counter.batches} add_entities calls, {counter.entities} entities"
+    )
+    print(
+        f"startup mean {statistics.mean(times):.2f} ms  "
+        f"median {statistics.median(times):.2f} ms  min {min(times):.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,28 @@
 """Support for Jaguar/Land Rover InControl services."""
+import asyncio
 import logging
-import urllib.error
 from datetime import timedelta
 
+import aiohttp
 import homeassistant.helpers.config_validation as cv
-import jlrpy
 import voluptuous as vol
-from homeassistant.const import (CONF_NAME, CONF_PASSWORD, CONF_SCAN_INTERVAL,
-                                 CONF_USERNAME)
+from homeassistant.const import (CONF_LATITUDE, CONF_LONGITUDE, CONF_NAME,
+                                 CONF_PASSWORD, CONF_RADIUS, CONF_SCAN_INTERVAL,
+                                 CONF_USERNAME, EVENT_HOMEASSISTANT_STOP)
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.discovery import async_load_platform
 from homeassistant.core import callback
 from homeassistant.helpers.dispatcher import (async_dispatcher_connect,
-                                              dispatcher_send)
+                                              async_dispatcher_send)
 from homeassistant.helpers.entity import Entity
-from homeassistant.helpers.event import (track_point_in_utc_time,
-                                         track_time_interval)
-from homeassistant.util.dt import utcnow
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.util.dt import parse_datetime, utcnow
+
+from . import jlrpy
+from .commands import CommandQueue
+from .geofence import Geofence, Zone
+from .scheduler import VehiclePollSchedule, is_active
+from .storage import AuthStore, SnapshotStore, geocode_cache_path
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,9 +30,42 @@ DOMAIN = "jlrincontrol"
 SIGNAL_VEHICLE_SEEN = "{}.vehicle_seen".format(DOMAIN)
 DATA_KEY = DOMAIN
 CONF_MUTABLE = "mutable"
+CONF_MAX_CONCURRENT = "max_concurrent_requests"
+CONF_MAX_SCAN_INTERVAL = "max_scan_interval"
+CONF_POSITION_INTERVAL = "position_interval"
+CONF_MIN_DISTANCE = "min_distance"
+CONF_MIN_HEADING = "min_heading"
+CONF_GEOFENCES = "geofences"
 
 MIN_UPDATE_INTERVAL = timedelta(minutes=1)
 DEFAULT_UPDATE_INTERVAL = timedelta(minutes=1)
+DEFAULT_MAX_UPDATE_INTERVAL = timedelta(minutes=30)
+DEFAULT_MAX_CONCURRENT = 4
+DEFAULT_POSITION_INTERVAL = timedelta(minutes=5)
+DEFAULT_MIN_DISTANCE = 50
+DEFAULT_MIN_HEADING = 30
+
+# Refresh policy per vehicle endpoint: (minimum age before refetching, Vehicle method).
+# Endpoints without a minimum age are fetched on every poll of the vehicle. The
+# position follows CONF_POSITION_INTERVAL, and every poll while the vehicle is active.
+# get_health_status is left out: it is a command asking the vehicle to run a health
+# check, which wakes a parked vehicle and only returns an acknowledgement.
+ENDPOINTS = {
+    "status": (None, "get_status_snapshot"),
+    "position": (DEFAULT_POSITION_INTERVAL, "get_position"),
+    "departure_timers": (timedelta(hours=1), "get_departure_timers"),
+    "wakeup_time": (timedelta(hours=1), "get_wakeup_time"),
+    "attributes": (timedelta(days=1), "get_attributes"),
+    "subscription_packages": (timedelta(days=1), "get_subscription_packages"),
+}
+
+# Errors of a request that failed to reach or get an answer from the API
+REQUEST_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, jlrpy.CircuitOpenError)
+
+# Same policy for endpoints of the account rather than of a vehicle
+ACCOUNT_ENDPOINTS = {
+    "user_info": (timedelta(days=1), "get_user_info"),
+}
 
 RESOURCES = {
     "FUEL_LEVEL_PERC": ("sensor", "fuel level perc", "mdi:fuel", "%"),
@@ -167,7 +208,27 @@ RESOURCES = {
     "IS_SUNROOF_OPEN": ("binary_sensor", "is sunroof open", "mdi:car", "",),
 }
 
-SIGNAL_STATE_UPDATED = f"{DOMAIN}.updated"
+# Sent per (vin, status key) whose value changed, and per (vin, dataset) that changed
+SIGNAL_ATTRIBUTE_UPDATED = DOMAIN + ".updated.{}.{}"
+SIGNAL_DATASET_UPDATED = DOMAIN + ".dataset_updated.{}.{}"
+# Sent per vin after every poll of the vehicle, successful or not
+SIGNAL_VEHICLE_POLLED = DOMAIN + ".polled.{}"
+# Per-vehicle sensor with the poll diagnostics, discovered next to the RESOURCES
+POLL_SENSOR = "poll"
+# Account-wide sensor with the depth of the request queue, discovered once as
+# (None, QUEUE_SENSOR)
+QUEUE_SENSOR = "request_queue"
+# Fired on the event bus when a vehicle enters or leaves one of the geofences
+EVENT_GEOFENCE = f"{DOMAIN}_geofence"
+
+GEOFENCE_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_NAME): cv.string,
+        vol.Required(CONF_LATITUDE): cv.latitude,
+        vol.Required(CONF_LONGITUDE): cv.longitude,
+        vol.Required(CONF_RADIUS): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    }
+)
 
 CONFIG_SCHEMA = vol.Schema(
     {
@@ -178,7 +239,25 @@ CONFIG_SCHEMA = vol.Schema(
                 vol.Optional(
                     CONF_SCAN_INTERVAL, default=DEFAULT_UPDATE_INTERVAL
                 ): vol.All(cv.time_period, vol.Clamp(min=MIN_UPDATE_INTERVAL)),
+                vol.Optional(
+                    CONF_MAX_SCAN_INTERVAL, default=DEFAULT_MAX_UPDATE_INTERVAL
+                ): vol.All(cv.time_period, vol.Clamp(min=MIN_UPDATE_INTERVAL)),
                 vol.Required(CONF_NAME): vol.Schema({cv.slug: cv.string}),
+                vol.Optional(
+                    CONF_MAX_CONCURRENT, default=DEFAULT_MAX_CONCURRENT
+                ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                vol.Optional(
+                    CONF_POSITION_INTERVAL, default=DEFAULT_POSITION_INTERVAL
+                ): vol.All(cv.time_period, vol.Clamp(min=MIN_UPDATE_INTERVAL)),
+                vol.Optional(
+                    CONF_MIN_DISTANCE, default=DEFAULT_MIN_DISTANCE
+                ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Optional(
+                    CONF_MIN_HEADING, default=DEFAULT_MIN_HEADING
+                ): vol.All(vol.Coerce(float), vol.Range(min=0, max=180)),
+                vol.Optional(CONF_GEOFENCES, default=[]): vol.All(
+                    cv.ensure_list, [GEOFENCE_SCHEMA]
+                ),
             }
         )
     },
@@ -186,75 +265,134 @@ CONFIG_SCHEMA = vol.Schema(
 )
 
 
-def setup(hass, config):
+async def async_setup(hass, config):
     """Set up the jlrpy component."""
 
     username = config[DOMAIN][CONF_USERNAME]
     password = config[DOMAIN][CONF_PASSWORD]
 
     state = hass.data[DATA_KEY] = JLRData(hass, config)
+    await state.async_load_snapshots()
 
     interval = config[DOMAIN][CONF_SCAN_INTERVAL]
 
-    try:
-        connection = jlrpy.Connection(username, password)
-    except urllib.error.HTTPError:
-        _LOGGER.error("Could not connect to JLR. Please check your credentials")
-        return False
-
-    vehicles = []
-    for vehicle in connection.vehicles:
-        vehicle.info = vehicle.get_status()
-        vehicles.append(vehicle)
-
-    def discover_vehicle(vehicle):
-        state.entities[vehicle.vin] = []
-
-        for attr, (component, *_) in RESOURCES.items():
-            hass.helpers.discovery.load_platform(
-                component, DOMAIN, (vehicle.vin, attr), config
+    connection = jlrpy.AsyncConnection(
+        username, password, session=async_get_clientsession(hass)
+    )
+    auth_store = AuthStore(hass, username, password)
+    connection.state_listener = lambda: auth_store.async_delay_save(
+        connection.export_state
+    )
+
+    connection.geocode_cache = jlrpy.GeocodeCache(geocode_cache_path(hass))
+    await hass.async_add_executor_job(connection.geocode_cache.load)
+
+    stored = await auth_store.async_load()
+    state.connection = connection
+
+    queue_sensor_discovered = False
+
+    @callback
+    def async_discover(vehicles):
+        """Load each platform once with every (vin, attribute) pair it provides."""
+        nonlocal queue_sensor_discovered
+        discovered = {}
+        if not queue_sensor_discovered:
+            queue_sensor_discovered = True
+            discovered["sensor"] = [(None, QUEUE_SENSOR)]
+        for vehicle in vehicles:
+            if vehicle.vin in state.entities:
+                continue
+            state.add_vehicle(vehicle)
+            state.entities[vehicle.vin] = []
+            for attr, (component, *_) in RESOURCES.items():
+                discovered.setdefault(component, []).append((vehicle.vin, attr))
+            discovered.setdefault("sensor", []).append((vehicle.vin, POLL_SENSOR))
+            discovered.setdefault("device_tracker", []).append(vehicle.vin)
+
+        for component, discovery_info in discovered.items():
+            hass.async_create_task(
+                async_load_platform(hass, component, DOMAIN, discovery_info, config)
             )
 
-    def update_vehicle(vehicle):
-        """Update information on vehicle."""
+    async def async_revalidate():
+        """Check the restored session and pick up vehicles added since."""
+        try:
+            try:
+                fresh = await connection.load_vehicles()
+            except aiohttp.ClientResponseError as ex:
+                if ex.status != 401:
+                    raise
+                await connection.connect()
+                fresh = await connection.load_vehicles()
+        except REQUEST_ERRORS as ex:
+            _LOGGER.warning("Could not revalidate the JLR session: %s", ex)
+            return
+        async_discover(fresh)
+
+    # While logged out, the next login attempt is due at login_retry
+    login_retry = None
+    login_delay = interval
+    login_task = None
+
+    async def async_start():
+        """Log in, discover the vehicles and run the first poll."""
+        nonlocal login_retry, login_delay
+        try:
+            await connection.connect()
+            vehicles = await connection.load_vehicles()
+        except REQUEST_ERRORS as ex:
+            reason = ex
+            if isinstance(ex, aiohttp.ClientResponseError) and ex.status in (
+                400,
+                401,
+                403,
+            ):
+                reason = "please check your credentials"
+            login_retry = utcnow() + login_delay
+            _LOGGER.error(
+                "Could not connect to JLR (%s), retrying in %s", reason, login_delay
+            )
+            login_delay = min(login_delay * 2, config[DOMAIN][CONF_MAX_SCAN_INTERVAL])
+            return
+        login_retry = None
+        async_discover(vehicles)
         _LOGGER.info("Pulling info from JLR")
+        await state.async_update(now=None)
+
+    async def async_tick(now):
+        """Poll the vehicles, or retry the login while logged out."""
+        nonlocal login_task
+        if login_retry is None:
+            await state.async_update(now)
+        elif (login_task is None or login_task.done()) and utcnow() >= login_retry:
+            login_task = hass.async_create_task(async_start())
+
+    # Nothing below waits on the network: a warm start reuses the saved session,
+    # a cold start logs in from a background task
+    if stored:
+        connection.restore_state(stored)
+        async_discover(connection.vehicles)
+        _LOGGER.info("Pulling info from JLR")
+        hass.async_create_task(state.async_update(now=None))
+        hass.async_create_task(async_revalidate())
+    else:
+        login_retry = utcnow()
+        login_task = hass.async_create_task(async_start())
 
-        state.vehicles[vehicle.vin] = vehicle
-        if vehicle.vin not in state.entities:
-            discover_vehicle(vehicle)
-        #
-        # for entity in state.entities[vehicle.vin]:
-        #     entity.schedule_update_ha_state()
-
-    #
-    #     dispatcher_send(hass, SIGNAL_VEHICLE_SEEN, vehicle)
-    #
-    # def update(now):
-    #     """Update status from the online service."""
-    #     try:
-    #         for vehicle in vehicles:
-    #             update_vehicle(vehicle)
-    #         return True
-    #     except urllib.error.HTTPError:
-    #         _LOGGER.error("Could not update vehicle status")
-    #         return False
-    #     finally:
-    #         track_point_in_utc_time(hass, update,
-    #                                 utcnow() + interval)
-    #
-    # return update(utcnow())
-
-    try:
-        for vehicle in vehicles:
-            update_vehicle(vehicle)
-        # return True
-    except urllib.error.HTTPError:
-        _LOGGER.error("Could not update vehicle status")
-        # return False
+    async_track_time_interval(hass, async_tick, interval)
+
+    async def async_stop(event):
+        """Cancel the queued commands and save the datasets changed since the last poll.
 
-    state.update(now=None)
+        Cancelling keeps any command worker from outliving Home Assistant.
+        """
+        await asyncio.gather(
+            *(queue.async_close() for queue in state.commands.values())
+        )
+        await state.async_save_snapshots()
 
-    track_time_interval(hass, state.update, interval)
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop)
 
     return True
 
@@ -266,9 +404,73 @@ class JLRData:
         """Initialize the component state."""
         self._hass = hass
         self.entities = {}
+        self.connection = None
         self.vehicles = {}
+        self.data = {}
+        self.account = {}
+        self.schedules = {}
+        self.commands = {}
+        self.stale = set()
+        self._fetched = {}
+        self._snapshots = SnapshotStore(hass)
+        # Set when a dataset changed since the snapshots were last saved
+        self._snapshots_dirty = False
         self.config = config[DOMAIN]
         self.names = self.config.get(CONF_NAME)
+        self._semaphore = asyncio.Semaphore(self.config[CONF_MAX_CONCURRENT])
+        self.endpoints = dict(
+            ENDPOINTS,
+            position=(self.config[CONF_POSITION_INTERVAL], ENDPOINTS["position"][1]),
+        )
+        self.geofence = Geofence(
+            Zone(
+                zone[CONF_NAME],
+                zone[CONF_LATITUDE],
+                zone[CONF_LONGITUDE],
+                zone[CONF_RADIUS],
+            )
+            for zone in self.config[CONF_GEOFENCES]
+        )
+
+    def add_vehicle(self, vehicle):
+        """Track a vehicle with its own adaptive poll schedule."""
+        self.vehicles[vehicle.vin] = vehicle
+        self.data.setdefault(vehicle.vin, {})
+        self.schedules[vehicle.vin] = VehiclePollSchedule(
+            self.config[CONF_SCAN_INTERVAL], self.config[CONF_MAX_SCAN_INTERVAL]
+        )
+        self.commands[vehicle.vin] = CommandQueue(
+            vehicle,
+            on_done=lambda command: self._async_command_done(vehicle.vin, command),
+        )
+
+    def boost(self, vin):
+        """Poll a vehicle fast from the next tick on, e.g. after a command."""
+        self.schedules[vin].boost(utcnow())
+
+    async def async_command(self, vin, name, *args):
+        """Run a Vehicle command through the queue of the vehicle.
+
+        Returns the final ServiceStatus once the vehicle carried the command out.
+        """
+        return await self.commands[vin].submit(name, *args)
+
+    async def async_set_charge_profile(self, vin, profile):
+        """Send a ChargeProfileBuilder in one chargeProfile command."""
+        return await self.async_command(vin, "set_charge_profile", profile.build())
+
+    @callback
+    def _async_command_done(self, vin, command):
+        """Refresh what a finished command changed and follow up closely."""
+        self.boost(vin)
+        for endpoint in command.datasets:
+            self._hass.async_create_task(self._async_refresh_quietly(vin, endpoint))
+
+    async def _async_refresh_quietly(self, vin, endpoint):
+        try:
+            await self.async_refresh(vin, endpoint)
+        except REQUEST_ERRORS as ex:
+            _LOGGER.warning("Could not refresh %s after a command: %s", endpoint, ex)
 
     def vehicle_name(self, vehicle):
         """Provide a friendly name for a vehicle."""
@@ -282,13 +484,231 @@ class JLRData:
 
         return ""
 
-    def update(self, now, **kwargs):
-        _LOGGER.info("Updating vehicle data")
-        # for vehicle in self.vehicles:
+    async def async_load_snapshots(self):
+        """Start from the datasets saved by the last run, flagged as stale."""
+        for vin, datasets in (await self._snapshots.async_load()).items():
+            data = self.data.setdefault(vin, {})
+            for endpoint, snapshot in datasets.items():
+                if endpoint not in ENDPOINTS:
+                    continue
+                value = snapshot["data"]
+                if endpoint == "status":
+                    value = jlrpy.VehicleStatus(value)
+                data[endpoint] = value
+                self._fetched[(vin, endpoint)] = parse_datetime(snapshot["fetched"])
+                if endpoint == "position":
+                    # Known position, no events: the vehicle did not just arrive
+                    self.geofence.update(vin, value)
+            self.stale.add(vin)
+
+    @callback
+    def _export_snapshots(self):
+        """Return the latest datasets of every vehicle in storable form."""
+        snapshots = {}
+        for (vin, endpoint), fetched in self._fetched.items():
+            value = self.data.get(vin, {}).get(endpoint)
+            if vin is None or value is None:
+                continue
+            if isinstance(value, jlrpy.VehicleStatus):
+                value = value.raw
+            snapshots.setdefault(vin, {})[endpoint] = {
+                "fetched": fetched.isoformat(),
+                "data": value,
+            }
+        return snapshots
+
+    @callback
+    def _async_save_snapshots_later(self):
+        """Schedule a save of the snapshots if a dataset changed since the last one."""
+        if self._snapshots_dirty:
+            self._snapshots_dirty = False
+            self._snapshots.async_delay_save(self._export_snapshots)
+
+    async def async_save_snapshots(self):
+        """Save the snapshots now if a dataset changed since the last save."""
+        if self._snapshots_dirty:
+            self._snapshots_dirty = False
+            await self._snapshots.async_save(self._export_snapshots())
+
+    def fetched(self, key, endpoint):
+        """Return when a dataset was last fetched successfully, or None."""
+        return self._fetched.get((key, endpoint))
+
+    def _due(self, policy, key, now):
+        """Return the endpoints of a policy that are due for a refresh."""
+        due = []
+        for endpoint, (max_age, _) in policy.items():
+            fetched = self._fetched.get((key, endpoint))
+            if max_age is None or fetched is None or now - fetched >= max_age:
+                due.append(endpoint)
+        return due
+
+    async def _async_fetch(self, source, policy, key, endpoint, store):
+        """Fetch one endpoint, holding a slot of the concurrency cap."""
+        async with self._semaphore:
+            result = await getattr(source, policy[endpoint][1])()
+        # Swap in the complete result so entities never see a half-updated dataset
+        previous = store.get(endpoint)
+        if endpoint == "status" and key in self.stale:
+            # First live status: write every entity once to drop the stale flag
+            self.stale.discard(key)
+            previous = None
+        store[endpoint] = result
+        self._fetched[(key, endpoint)] = utcnow()
+        if key is not None:
+            self._async_notify(key, endpoint, previous, result)
+
+    @callback
+    def _async_mark_stale(self, vin):
+        """Keep serving the last data of a vehicle, flagged as stale."""
+        if vin in self.stale:
+            return
+        self.stale.add(vin)
+        status = self.data[vin].get("status")
+        if status is not None:
+            # Write every entity once so the stale flag shows
+            self._async_notify(vin, "status", None, status)
+
+    @callback
+    def _async_notify(self, vin, endpoint, previous, result):
+        """Signal only the status keys or datasets whose value changed."""
+        if endpoint == "status":
+            changed = result.changed_keys(previous)
+            self._snapshots_dirty |= bool(changed)
+            for attribute in changed:
+                async_dispatcher_send(
+                    self._hass, SIGNAL_ATTRIBUTE_UPDATED.format(vin, attribute)
+                )
+        elif result != previous:
+            self._snapshots_dirty = True
+            async_dispatcher_send(
+                self._hass, SIGNAL_DATASET_UPDATED.format(vin, endpoint)
+            )
+            if endpoint == "position":
+                self._async_check_geofences(vin, result)
+
+    @callback
+    def _async_check_geofences(self, vin, position):
+        """Fire an event for every geofence the vehicle entered or left."""
+        for event in self.geofence.update(vin, position):
+            self._hass.bus.async_fire(
+                EVENT_GEOFENCE,
+                {
+                    "vin": vin,
+                    "name": self.vehicle_name(self.vehicles.get(vin)),
+                    "event": event.event,
+                    "zone": event.zone.name,
+                },
+            )
+
+    async def async_refresh(self, vin, endpoint):
+        """Refetch one dataset of a vehicle now, whatever its refresh policy."""
+        await self._async_fetch(
+            self.vehicles[vin], self.endpoints, vin, endpoint, self.data[vin]
+        )
+
+    async def async_update_vehicle(self, vehicle):
+        """Fetch every dataset of a vehicle that is due in one batch."""
+        endpoints = self._due(self.endpoints, vehicle.vin, utcnow())
+        status = self.data[vehicle.vin].get("status")
+        if "position" not in endpoints and is_active(status):
+            # Follow a vehicle that is on the move at the fast poll rate
+            endpoints.append("position")
+        results = await asyncio.gather(
+            *(
+                self._async_fetch(
+                    vehicle,
+                    self.endpoints,
+                    vehicle.vin,
+                    endpoint,
+                    self.data[vehicle.vin],
+                )
+                for endpoint in endpoints
+            ),
+            return_exceptions=True,
+        )
+        for endpoint, result in zip(endpoints, results):
+            if not isinstance(result, Exception):
+                continue
+            if endpoint == "status":
+                raise result
+            _LOGGER.warning(
+                "Could not update %s of %s: %s",
+                endpoint,
+                self.vehicle_name(vehicle),
+                result,
+            )
 
-        for vehicle in self.vehicles:
-            self.vehicles[vehicle].get_status()
-        dispatcher_send(self._hass, SIGNAL_STATE_UPDATED)
+    async def async_update_account(self):
+        """Fetch the account datasets that are due."""
+        for endpoint in self._due(ACCOUNT_ENDPOINTS, None, utcnow()):
+            try:
+                await self._async_fetch(
+                    self.connection, ACCOUNT_ENDPOINTS, None, endpoint, self.account
+                )
+            except REQUEST_ERRORS as ex:
+                _LOGGER.warning("Could not update %s: %s", endpoint, ex)
+
+    async def async_update(self, now, **kwargs):
+        """Poll the vehicles whose schedule is due, never overlapping a running poll."""
+        now = utcnow()
+        vehicles = []
+        for vin, vehicle in self.vehicles.items():
+            schedule = self.schedules[vin]
+            if not schedule.is_due(now):
+                continue
+            if schedule.in_flight:
+                schedule.missed += 1
+                _LOGGER.warning(
+                    "Previous update of %s still running, skipped (%d missed)",
+                    self.vehicle_name(vehicle),
+                    schedule.missed,
+                )
+                continue
+            schedule.in_flight = True
+            vehicles.append(vehicle)
+
+        if not vehicles:
+            return
+
+        _LOGGER.info("Updating vehicle data")
+        try:
+            results = await asyncio.gather(
+                self.async_update_account(),
+                *(self.async_update_vehicle(vehicle) for vehicle in vehicles),
+                return_exceptions=True,
+            )
+            results = results[1:]
+        finally:
+            for vehicle in vehicles:
+                self.schedules[vehicle.vin].in_flight = False
+
+        # Anchor the next poll to the tick that started this one: measured from the
+        # end, the next tick would be a fetch-duration short and skip a whole interval
+        for vehicle, result in zip(vehicles, results):
+            schedule = self.schedules[vehicle.vin]
+            if isinstance(result, Exception):
+                schedule.record_failure(now)
+                self._async_mark_stale(vehicle.vin)
+                # An open circuit was reported once when it opened
+                log = (
+                    _LOGGER.debug
+                    if isinstance(result, jlrpy.CircuitOpenError)
+                    else _LOGGER.error
+                )
+                log(
+                    "Could not update status of %s: %s",
+                    self.vehicle_name(vehicle),
+                    result,
+                )
+            else:
+                schedule.record(now, self.data[vehicle.vin].get("status"))
+            async_dispatcher_send(
+                self._hass, SIGNAL_VEHICLE_POLLED.format(vehicle.vin)
+            )
+        self._async_save_snapshots_later()
+        if self.connection.geocode_cache.dirty:
+            self._hass.async_add_executor_job(self.connection.geocode_cache.save)
 
 
 class JLREntity(Entity):
@@ -302,22 +722,40 @@ class JLREntity(Entity):
         self._data = self._hass.data[DATA_KEY]
         self._vehicle = self._hass.data[DATA_KEY].vehicles[self._vin]
         self._name = self._data.vehicle_name(self.vehicle)
+        self._unsub_dispatchers = []
 
-    @staticmethod
-    def get_vehicle_status(vehicle_status):
-        """Converts a weird quasi-dict returned by jlrpy into a proper dict"""
-        dict_only = {}
-        for element in vehicle_status:
-            if element.get("key"):
-                dict_only[element.get("key")] = element.get("value")
-        return dict_only
+    def get_data(self, endpoint):
+        """Return the latest dataset fetched from an endpoint of the vehicle."""
+        return self._data.data[self._vin].get(endpoint)
 
     def get_updated_info(self):
-        return self.get_vehicle_status(self.vehicle.info.get("vehicleStatus"))
+        """Return the latest status snapshot of the vehicle, parsed once per poll."""
+        return self.get_data("status")
 
     def update(self):
         _LOGGER.info("UPDATING NOW")
 
+    def _signals(self):
+        """Return the dispatcher signals that change what the entity shows."""
+        return [
+            SIGNAL_ATTRIBUTE_UPDATED.format(self._vin, self._attribute),
+            # The model attribute comes from the attributes dataset
+            SIGNAL_DATASET_UPDATED.format(self._vin, "attributes"),
+        ]
+
+    async def async_added_to_hass(self):
+        """Write state only when something the entity shows changed."""
+        self._unsub_dispatchers = [
+            async_dispatcher_connect(self.hass, signal, self.async_write_ha_state)
+            for signal in self._signals()
+        ]
+
+    async def async_will_remove_from_hass(self):
+        """Disconnect from the update signals."""
+        for unsub in self._unsub_dispatchers:
+            unsub()
+        self._unsub_dispatchers = []
+
     @property
     def vehicle(self):
         """Return vehicle."""
@@ -347,12 +785,17 @@ class JLREntity(Entity):
 
     @property
     def device_state_attributes(self):
-        """Return device specific state attributes."""
-        vehicle_attr = self.vehicle.get_attributes()
-        return dict(
-            model="{} {} {}".format(
+        """Return device specific state attributes.
+
+        Values that change with every poll are on the POLL_SENSOR of the vehicle,
+        the account-wide request queue is on the QUEUE_SENSOR.
+        """
+        attrs = dict(stale=self._vin in self._data.stale)
+        vehicle_attr = self.get_data("attributes")
+        if vehicle_attr:
+            attrs["model"] = "{} {} {}".format(
                 vehicle_attr["modelYear"],
                 vehicle_attr["vehicleBrand"],
                 vehicle_attr["vehicleType"],
             )
-        )
+        return attrs
@@ -0,0 +1,266 @@
+"""Vectorized analytics over the trip history of JLR InControl vehicles.
+
+Trips as returned by jlrpy (Vehicle.get_trips, Vehicle.iter_trips or
+TripStore.trips) are turned into columnar NumPy arrays once, after which every
+aggregate is a handful of array operations. NumPy is optional: the module can be
+imported without it, building a TripFrame raises ImportError.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SECONDS_PER_DAY = 86400
+# 1970-01-01 was a Thursday, weekday() numbering has Monday as 0
+EPOCH_WEEKDAY = 3
+
+# Column name -> key in tripDetails, all converted to float with NaN when missing
+DETAIL_COLUMNS = {
+    "distance": "distance",  # metres
+    "fuel": "fuelConsumption",  # litres
+    "energy": "electricalConsumption",  # kWh
+    "regeneration": "electricalRegeneration",  # kWh
+}
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _floats(values):
+    # NumPy converts None to NaN by itself, only odd values need the slow path
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([_number(value) for value in values], dtype=np.float64)
+
+
+def _datetime64(value):
+    try:
+        return np.datetime64(value, "s")
+    except ValueError:
+        return np.datetime64("NaT", "s")
+
+
+def _epoch_seconds(values):
+    """Parse API timestamps (2019-08-03T15:47:27+0000) into epoch seconds.
+
+    Missing or malformed values become -1; see TripFrame.valid.
+    """
+    text = np.array([value or "" for value in values], dtype="U24")
+    try:
+        local = text.astype("U19").astype("datetime64[s]")
+    except ValueError:
+        local = np.array([_datetime64(value) for value in text.astype("U19")])
+    local = local.astype(np.int64)
+
+    # Offset characters as code points, parsed without leaving NumPy
+    chars = text.view(np.uint32).reshape(len(text), 24)[:, 19:]
+    sign = np.where(chars[:, 0] == ord("-"), -1, 1)
+    has_offset = (chars[:, 0] == ord("+")) | (chars[:, 0] == ord("-"))
+    digits = chars[:, 1:].astype(np.int64) - ord("0")
+    offset = (digits[:, 0] * 10 + digits[:, 1]) * 3600 + (
+        digits[:, 2] * 10 + digits[:, 3]
+    ) * 60
+    seconds = local - np.where(has_offset, sign * offset, 0)
+    return np.where(local == np.iinfo(np.int64).min, -1, seconds)
+
+
+class TripFrame:
+    """Trips of one or more vehicles as columns of equal length.
+
+    ``vin`` holds an index into ``vins`` for every trip, ``start`` and ``end`` are
+    epoch seconds (-1 when unknown) and the DETAIL_COLUMNS are floats (NaN when
+    unknown). Totals skip unknown values.
+    """
+
+    def __init__(self, vins, columns):
+        """Initialize from a list of VINs and a dict of equally long arrays."""
+        if np is None:
+            raise ImportError("Trip analytics require numpy")
+        self.vins = list(vins)
+        self.vin = columns["vin"]
+        self.start = columns["start"]
+        self.end = columns["end"]
+        for name in DETAIL_COLUMNS:
+            setattr(self, name, columns[name])
+
+    @classmethod
+    def from_trips(cls, trips, vin=None):
+        """Build a frame from the trips of a single vehicle."""
+        return cls.from_vehicles({vin: trips})
+
+    @classmethod
+    def from_vehicles(cls, trips_by_vin):
+        """Build a frame from a {vin: trips} mapping."""
+        if np is None:
+            raise ImportError("Trip analytics require numpy")
+        vins = []
+        codes = []
+        details = []
+        for vin, trips in trips_by_vin.items():
+            trip_details = [trip.get("tripDetails") or {} for trip in trips]
+            codes.append(np.full(len(trip_details), len(vins), dtype=np.int32))
+            vins.append(vin)
+            details.extend(trip_details)
+
+        columns = {
+            "vin": np.concatenate(codes) if codes else np.zeros(0, np.int32),
+            "start": _epoch_seconds([d.get("startTime") for d in details]),
+            "end": _epoch_seconds([d.get("endTime") for d in details]),
+        }
+        for name, key in DETAIL_COLUMNS.items():
+            columns[name] = _floats([d.get(key) for d in details])
+        return cls(vins, columns)
+
+    def __len__(self):
+        """Return the number of trips."""
+        return len(self.vin)
+
+    @property
+    def valid(self):
+        """Boolean mask of the trips with a known start and end time."""
+        return (self.start >= 0) & (self.end >= self.start)
+
+    @property
+    def duration(self):
+        """Trip durations in seconds, NaN when unknown."""
+        return np.where(self.valid, self.end - self.start, np.nan)
+
+    @property
+    def speed(self):
+        """Average speed of every trip in km/h, NaN when unknown."""
+        duration = self.duration
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(duration > 0, self.distance * 3.6 / duration, np.nan)
+
+    def select(self, mask):
+        """Return a frame with only the trips where mask is True."""
+        columns = {
+            name: getattr(self, name)[mask]
+            for name in ("vin", "start", "end", *DETAIL_COLUMNS)
+        }
+        return TripFrame(self.vins, columns)
+
+    def between(self, start=None, end=None):
+        """Return the trips started within [start, end), both aware datetimes or None."""
+        mask = self.start >= 0
+        if start is not None:
+            mask &= self.start >= int(start.timestamp())
+        if end is not None:
+            mask &= self.start < int(end.timestamp())
+        return self.select(mask)
+
+    def _totals(self):
+        # Per-vehicle sums of every column in one bincount each
+        count = len(self.vins)
+        valid = self.valid
+        totals = {
+            "trips": np.bincount(self.vin, minlength=count),
+            "duration": np.bincount(
+                self.vin,
+                np.where(valid, self.end - self.start, 0).astype(np.float64),
+                count,
+            ),
+        }
+        for name in DETAIL_COLUMNS:
+            values = getattr(self, name)
+            known = ~np.isnan(values)
+            totals[name] = np.bincount(self.vin, np.where(known, values, 0), count)
+            # Efficiency is taken over the distance of trips that report the value
+            totals[name + "_distance"] = np.bincount(
+                self.vin, np.where(known, np.nan_to_num(self.distance), 0), count
+            )
+        return totals
+
+    def summary(self):
+        """Return {vin: totals and averages} over all trips of every vehicle.
+
+        Distances are in km, durations in hours, speed in km/h, fuel in l/100km
+        and energy in kWh/100km.
+        """
+        totals = self._totals()
+        distance_km = totals["distance"] / 1000
+        hours = totals["duration"] / 3600
+        with np.errstate(divide="ignore", invalid="ignore"):
+            speed = np.where(hours > 0, distance_km / hours, np.nan)
+            efficiency = {
+                name: np.where(
+                    totals[name + "_distance"] > 0,
+                    totals[name] * 100000 / totals[name + "_distance"],
+                    np.nan,
+                )
+                for name in ("fuel", "energy")
+            }
+
+        return {
+            vin: {
+                "trips": int(totals["trips"][i]),
+                "distance": float(distance_km[i]),
+                "duration": float(hours[i]),
+                "average_speed": float(speed[i]),
+                "fuel": float(totals["fuel"][i]),
+                "fuel_efficiency": float(efficiency["fuel"][i]),
+                "energy": float(totals["energy"][i]),
+                "energy_efficiency": float(efficiency["energy"][i]),
+                "regeneration": float(totals["regeneration"][i]),
+            }
+            for i, vin in enumerate(self.vins)
+        }
+
+    def _distribution(self, buckets, bucket_of, weights):
+        mask = self.start >= 0
+        index = self.vin[mask] * buckets + bucket_of[mask]
+        if weights is not None:
+            weights = np.nan_to_num(np.asarray(weights, np.float64)[mask])
+        counts = np.bincount(index, weights, len(self.vins) * buckets)
+        return {
+            vin: counts[i * buckets : (i + 1) * buckets]
+            for i, vin in enumerate(self.vins)
+        }
+
+    def by_hour(self, utc_offset=0, weights=None):
+        """Return {vin: 24 trip counts (or summed weights) by hour of the start time}.
+
+        utc_offset is in seconds and shifts the hours to local time; weights may be
+        any column of the frame, e.g. frame.distance.
+        """
+        local = self.start + utc_offset
+        return self._distribution(24, (local % SECONDS_PER_DAY) // 3600, weights)
+
+    def by_weekday(self, utc_offset=0, weights=None):
+        """Return {vin: 7 trip counts (or summed weights) by weekday, Monday first}."""
+        days = (self.start + utc_offset) // SECONDS_PER_DAY
+        return self._distribution(7, (days + EPOCH_WEEKDAY) % 7, weights)
+
+    def rolling(self, column="distance", days=7, utc_offset=0):
+        """Return {vin: (dates, sums)} of a column over a trailing window of days.
+
+        dates is a datetime64[D] array with every day from the first to the last
+        trip of the vehicle; sums[i] totals the column over the window ending on
+        dates[i]. Use column="trips" to count trips.
+        """
+        mask = self.start >= 0
+        day = (self.start[mask] + utc_offset) // SECONDS_PER_DAY
+        vin = self.vin[mask]
+        if column == "trips":
+            values = np.ones(len(day))
+        else:
+            values = np.nan_to_num(getattr(self, column)[mask])
+
+        result = {}
+        for i, name in enumerate(self.vins):
+            own = vin == i
+            if not own.any():
+                result[name] = (np.zeros(0, "datetime64[D]"), np.zeros(0))
+                continue
+            first = day[own].min()
+            daily = np.bincount(day[own] - first, values[own])
+            total = np.concatenate(([0.0], np.cumsum(daily)))
+            window = total[1:] - total[np.maximum(np.arange(len(daily)) + 1 - days, 0)]
+            dates = np.arange(first, first + len(daily)).astype("datetime64[D]")
+            result[name] = (dates, window)
+        return result
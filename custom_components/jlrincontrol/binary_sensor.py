@@ -12,7 +12,7 @@ def setup_platform(hass, config, add_devices, discovery_info=None):
     """Set up the JLR Binary sensors."""
     if discovery_info is None:
         return
-    add_devices([JLRSensor(hass, *discovery_info)])
+    add_devices([JLRSensor(hass, vin, attr) for vin, attr in discovery_info])
 
 
 class JLRSensor(JLREntity, BinarySensorDevice):
@@ -21,20 +21,16 @@ class JLRSensor(JLREntity, BinarySensorDevice):
     @property
     def is_on(self):
         """Return true if the binary sensor is on."""
-        val = self.get_updated_info()
-        if val is None:
-            return val
-
-        if val:
-            val = val[self._attribute]
-        else:
+        info = self.get_updated_info()
+        if not info:
             return None
+        val = info.get(self._attribute)
 
         if self._attribute in [
             "DOOR_IS_ALL_DOORS_LOCKED",
             "IS_SUNROOF_OPEN"
         ]:
-            return bool(val == "FALSE")
+            return val is False
 
         return val
 
@@ -0,0 +1,196 @@
+"""Per-vehicle queue of remote commands, tracked until the vehicle carried them out."""
+import asyncio
+import logging
+
+from . import jlrpy
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 2
+DEFAULT_MAX_POLL_INTERVAL = 30
+DEFAULT_TIMEOUT = 300
+
+# ServiceStatus values that end a command
+STATUS_SUCCESSFUL = "Successful"
+STATUS_FINAL = (STATUS_SUCCESSFUL, "Failed", "Cancelled", "Rejected", "Timeout")
+
+# Commands of a group act on the same thing, so a later one makes an earlier one
+# that did not start yet pointless (start then stop preconditioning, lock then unlock).
+# Other commands, e.g. set_charge_profile with different changes, are never replaced.
+COMMAND_GROUPS = {
+    "lock": "doors",
+    "unlock": "doors",
+    "preconditioning_start": "climate",
+    "preconditioning_stop": "climate",
+    "charging_start": "charging",
+    "charging_stop": "charging",
+    "set_wakeup_time": "wakeup",
+    "delete_wakeup_time": "wakeup",
+    "enable_privacy_mode": "privacy",
+    "disable_privacy_mode": "privacy",
+}
+
+# Datasets to refresh once a command completed, the status unless listed here
+COMMAND_DATASETS = {
+    "set_wakeup_time": ("wakeup_time",),
+    "delete_wakeup_time": ("wakeup_time",),
+    "add_departure_timer": ("departure_timers",),
+    # Charge limits and the charging mode of a profile show up in the status
+    "set_charge_profile": ("departure_timers", "status"),
+    "add_repeated_departure_timer": ("departure_timers",),
+    "delete_departure_timer": ("departure_timers",),
+}
+
+
+class CommandError(Exception):
+    """A remote command did not complete."""
+
+
+class CommandFailed(CommandError):
+    """The vehicle reported that it did not carry out the command."""
+
+    def __init__(self, status):
+        """Initialize with the final ServiceStatus."""
+        super().__init__(f"Command ended with status {status.get('status')}")
+        self.status = status
+
+
+class CommandTimeout(CommandError):
+    """The command did not reach a final status in time."""
+
+
+class CommandSuperseded(CommandError):
+    """A later command of the same group replaced the command before it started."""
+
+
+class Command:
+    """A queued call of a vehicle command method."""
+
+    __slots__ = ("name", "args", "group", "future")
+
+    def __init__(self, name, args, future):
+        """Initialize the command."""
+        self.name = name
+        self.args = args
+        self.group = COMMAND_GROUPS.get(name, name)
+        self.future = future
+
+    @property
+    def datasets(self):
+        """Return the datasets the command changes."""
+        return COMMAND_DATASETS.get(self.name, ("status",))
+
+
+class CommandQueue:
+    """Run the commands of one vehicle one at a time.
+
+    submit() returns a future resolving to the final ServiceStatus of the command.
+    A command identical to the last one of its group shares that command's future;
+    a pending command of the same COMMAND_GROUPS group is replaced (its future
+    raises CommandSuperseded). After sending, the service status is polled with
+    exponential backoff until it is final. on_done(command) is called after every
+    command, successful or not, unless the queue was closed by async_close().
+    """
+
+    def __init__(
+        self,
+        vehicle,
+        on_done=None,
+        poll_interval=DEFAULT_POLL_INTERVAL,
+        max_poll_interval=DEFAULT_MAX_POLL_INTERVAL,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        """Initialize the queue of an AsyncVehicle."""
+        self._vehicle = vehicle
+        self._on_done = on_done
+        self._poll_interval = poll_interval
+        self._max_poll_interval = max_poll_interval
+        self._timeout = timeout
+        self._pending = []
+        self._running = None
+        self._worker = None
+
+    def __len__(self):
+        """Return the number of commands waiting or running."""
+        return len(self._pending) + (self._running is not None)
+
+    def submit(self, name, *args):
+        """Queue a call of vehicle.<name>(*args) and return its future."""
+        group = COMMAND_GROUPS.get(name, name)
+        last = None
+        for command in (self._running, *self._pending):
+            if command is not None and command.group == group:
+                last = command
+        if last is not None and last.name == name and last.args == args:
+            return last.future
+
+        command = Command(name, args, asyncio.get_event_loop().create_future())
+        superseded = [
+            c for c in self._pending if c.group == group and name in COMMAND_GROUPS
+        ]
+        for pending in superseded:
+            self._pending.remove(pending)
+            pending.future.set_exception(
+                CommandSuperseded(f"{pending.name} replaced by {name}")
+            )
+        self._pending.append(command)
+        if self._worker is None:
+            self._worker = asyncio.ensure_future(self._async_run())
+        return command.future
+
+    async def _async_run(self):
+        # Commands and their status polls go ahead of regular polling
+        jlrpy.request_priority.set(jlrpy.PRIORITY_COMMAND)
+        try:
+            while self._pending:
+                command = self._running = self._pending.pop(0)
+                try:
+                    result = await self._async_execute(command)
+                except asyncio.CancelledError:
+                    # Closed: nothing to follow up on
+                    self._running = None
+                    command.future.cancel()
+                    raise
+                except Exception as ex:  # pylint: disable=broad-except
+                    command.future.set_exception(ex)
+                else:
+                    command.future.set_result(result)
+                self._running = None
+                if self._on_done is not None:
+                    self._on_done(command)
+        finally:
+            self._worker = None
+            for command in self._pending:
+                command.future.cancel()
+            self._pending.clear()
+
+    async def _async_execute(self, command):
+        """Send a command and follow its service status until it is final."""
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self._timeout
+        status = await getattr(self._vehicle, command.name)(*command.args)
+        service_id = (status or {}).get("customerServiceId")
+        if service_id is None:
+            # Nothing to follow, e.g. a configuration change applied at once
+            return status
+
+        delay = self._poll_interval
+        while status.get("status") not in STATUS_FINAL:
+            if loop.time() + delay > deadline:
+                raise CommandTimeout(
+                    f"{command.name} still {status.get('status')} after {self._timeout}s"
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self._max_poll_interval)
+            status = await self._vehicle.get_service_status(service_id)
+            _LOGGER.debug("%s: %s", command.name, status.get("status"))
+
+        if status["status"] != STATUS_SUCCESSFUL:
+            raise CommandFailed(status)
+        return status
+
+    async def async_close(self):
+        """Cancel the running and pending commands."""
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
@@ -5,31 +5,121 @@ from homeassistant.components.device_tracker import SOURCE_TYPE_GPS
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.util import slugify
 
-from . import DATA_KEY, SIGNAL_STATE_UPDATED
+from . import (
+    CONF_MIN_DISTANCE,
+    CONF_MIN_HEADING,
+    DATA_KEY,
+    REQUEST_ERRORS,
+    SIGNAL_DATASET_UPDATED,
+)
+from .routes import distance
 
 _LOGGER = logging.getLogger(__name__)
 
 
+def _heading_change(previous, current):
+    if previous is None or current is None:
+        return 0
+    change = abs(float(current) - float(previous)) % 360
+    return min(change, 360 - change)
+
+
+def _address(result):
+    return (result or {}).get("formattedAddress")
+
+
+class JLRTracker:
+    """Report the position of a vehicle whenever it moved far enough.
+
+    The address of the position is reported with it when the geocode cache holds
+    it; otherwise it is looked up in the background and reported once known.
+    """
+
+    def __init__(self, hass, async_see, vin):
+        """Initialize the tracker."""
+        self._hass = hass
+        self._data = hass.data[DATA_KEY]
+        self._async_see = async_see
+        self._vin = vin
+        self._min_distance = self._data.config[CONF_MIN_DISTANCE]
+        self._min_heading = self._data.config[CONF_MIN_HEADING]
+        self._seen = None
+
+    def _moved(self, latitude, longitude, heading, accuracy):
+        if self._seen is None:
+            return True
+        seen_latitude, seen_longitude, seen_heading, seen_accuracy = self._seen
+        return (
+            accuracy != seen_accuracy
+            or distance(seen_latitude, seen_longitude, latitude, longitude)
+            > self._min_distance
+            or _heading_change(seen_heading, heading) > self._min_heading
+        )
+
+    async def async_see_vehicle(self):
+        """Handle a new position of the vehicle."""
+        position = (self._data.data[self._vin].get("position") or {}).get("position")
+        if not position:
+            return
+        latitude = position.get("latitude")
+        longitude = position.get("longitude")
+        if latitude is None or longitude is None:
+            return
+        heading = position.get("heading")
+        # Not every vehicle reports the accuracy of its fix
+        accuracy = position.get("accuracy")
+        if not self._moved(latitude, longitude, heading, accuracy):
+            return
+        seen = self._seen = (latitude, longitude, heading, accuracy)
+
+        cached = self._data.connection.geocode_cache.get(latitude, longitude)
+        await self._async_report(position, _address(cached))
+        if cached is None:
+            self._hass.async_create_task(self._async_look_up(position, seen))
+
+    async def _async_look_up(self, position, seen):
+        """Report the address of a position once the API returned it."""
+        try:
+            result = await self._data.connection.reverse_geocode(seen[0], seen[1])
+        except REQUEST_ERRORS as ex:
+            _LOGGER.debug("Could not look up the address of %s: %s", self._vin, ex)
+            return
+        # The vehicle may have moved on while the address was looked up
+        if self._seen == seen and _address(result) is not None:
+            await self._async_report(position, _address(result))
+
+    async def _async_report(self, position, address):
+        host_name = self._data.vehicle_name(self._data.vehicles[self._vin])
+        see = {
+            "dev_id": slugify(host_name),
+            "host_name": host_name,
+            "source_type": SOURCE_TYPE_GPS,
+            "gps": (position["latitude"], position["longitude"]),
+            "icon": "mdi:car",
+            "attributes": {
+                "heading": position.get("heading"),
+                "speed": position.get("speed"),
+                "address": address,
+            },
+        }
+        if position.get("accuracy") is not None:
+            see["gps_accuracy"] = position["accuracy"]
+        await self._async_see(**see)
+
+
 async def async_setup_scanner(hass, config, async_see, discovery_info=None):
-    """Set up the Volvo tracker."""
+    """Set up the JLR tracker."""
     if discovery_info is None:
         return
 
-    p = v.get_position()
-    gps_position = (p["position"]["latitude"], p["position"]["longitude"])
-
-    async def see_vehicle():
-        """Handle the reporting of the vehicle position."""
-        host_name = data.vehicle_name(vehicle)
-        dev_id = '{}'.format(slugify(host_name))
-        await async_see(
-            dev_id=dev_id,
-            host_name=host_name,
-            source_type=SOURCE_TYPE_GPS,
-            gps=gps_position,
-            icon="mdi:car",
+    for vin in discovery_info:
+        tracker = JLRTracker(hass, async_see, vin)
+        async_dispatcher_connect(
+            hass,
+            SIGNAL_DATASET_UPDATED.format(vin, "position"),
+            tracker.async_see_vehicle,
         )
-
-    async_dispatcher_connect(hass, SIGNAL_STATE_UPDATED, see_vehicle)
+        # Start from the last known position, e.g. a stored snapshot
+        await tracker.async_see_vehicle()
 
     return True
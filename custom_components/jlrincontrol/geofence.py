@@ -0,0 +1,140 @@
+"""Geofencing of vehicle positions against many zones through a grid index."""
+from collections import namedtuple
+import math
+
+from .routes import EARTH_RADIUS, distance
+
+DEFAULT_CELL_SIZE = 1000  # metres
+# Zones spanning more cells are checked for every position instead of indexed
+MAX_ZONE_CELLS = 64
+EVENT_ENTER = "enter"
+EVENT_EXIT = "exit"
+
+Zone = namedtuple("Zone", ["name", "latitude", "longitude", "radius"])
+GeofenceEvent = namedtuple("GeofenceEvent", ["event", "vin", "zone"])
+
+METRES_PER_DEGREE = math.radians(1) * EARTH_RADIUS
+
+
+def _position(result):
+    """Return (latitude, longitude) from a get_position result or a bare position."""
+    position = (result or {}).get("position") or result or {}
+    latitude = position.get("latitude")
+    longitude = position.get("longitude")
+    if latitude is None or longitude is None:
+        return None
+    return float(latitude), float(longitude)
+
+
+class Geofence:
+    """Circular zones in a uniform lat/lon grid, with the zones every vehicle is in.
+
+    Every zone is registered in the cells its bounding box overlaps, so checking a
+    position only measures the distance to the few zones sharing its cell, however
+    many zones there are. Columns wrap around at the antimeridian; zones covering
+    more than MAX_ZONE_CELLS cells are kept aside and checked for every position.
+    update() returns enter and exit events on transitions only.
+    """
+
+    def __init__(self, zones=(), cell_size=DEFAULT_CELL_SIZE):
+        """Initialize the index with cells of about cell_size metres."""
+        self._cell = cell_size / METRES_PER_DEGREE
+        # Columns a whole number of times around the globe, so that they wrap
+        self._columns = math.ceil(360 / self._cell)
+        self._column_width = 360 / self._columns
+        self._grid = {}
+        self._large = []
+        self.zones = {}
+        self.inside = {}
+        for zone in zones:
+            self.add_zone(zone)
+
+    def _row(self, latitude):
+        return math.floor(latitude / self._cell)
+
+    def _column(self, longitude):
+        # Unwrapped: -180 is column 0, every further 360 degrees adds _columns
+        return math.floor((longitude + 180) / self._column_width)
+
+    def _cell_of(self, latitude, longitude):
+        return self._row(latitude), self._column(longitude) % self._columns
+
+    def _cells(self, zone):
+        lat_extent = zone.radius / METRES_PER_DEGREE
+        # Longitude degrees shrink towards the poles, widen the box accordingly
+        cos_lat = max(math.cos(math.radians(zone.latitude)), 1e-6)
+        lon_extent = min(lat_extent / cos_lat, 180.0)
+        rows = range(
+            self._row(zone.latitude - lat_extent),
+            self._row(zone.latitude + lat_extent) + 1,
+        )
+        west = self._column(zone.longitude - lon_extent)
+        east = self._column(zone.longitude + lon_extent)
+        if len(rows) * (east - west + 1) > MAX_ZONE_CELLS:
+            return None
+        return [
+            (row, column % self._columns)
+            for row in rows
+            for column in range(west, east + 1)
+        ]
+
+    def add_zone(self, zone):
+        """Add a zone, replacing any zone of the same name."""
+        if zone.name in self.zones:
+            self.remove_zone(zone.name)
+        self.zones[zone.name] = zone
+        cells = self._cells(zone)
+        if cells is None:
+            self._large.append(zone)
+            return
+        for cell in cells:
+            self._grid.setdefault(cell, []).append(zone)
+
+    def remove_zone(self, name):
+        """Remove a zone; vehicles inside it are not sent an exit event."""
+        zone = self.zones.pop(name)
+        cells = self._cells(zone)
+        if cells is None:
+            self._large.remove(zone)
+        else:
+            for cell in cells:
+                bucket = self._grid[cell]
+                bucket.remove(zone)
+                if not bucket:
+                    del self._grid[cell]
+        for names in self.inside.values():
+            names.discard(name)
+
+    def zones_at(self, latitude, longitude):
+        """Return the names of the zones containing a position."""
+        candidates = self._grid.get(self._cell_of(latitude, longitude), [])
+        return {
+            zone.name
+            for zone in candidates + self._large
+            if distance(zone.latitude, zone.longitude, latitude, longitude)
+            <= zone.radius
+        }
+
+    def update(self, vin, result):
+        """Record a new position of a vehicle and return the resulting events.
+
+        result is a get_position response (or its "position"); a result without
+        coordinates leaves the vehicle where it was. The first position of a
+        vehicle only records the zones it is in: a vehicle parked in a zone when
+        tracking starts did not just enter it.
+        """
+        position = _position(result)
+        if position is None:
+            return []
+        current = self.zones_at(*position)
+        previous = self.inside.get(vin)
+        self.inside[vin] = current
+        if previous is None:
+            return []
+        return [
+            GeofenceEvent(EVENT_EXIT, vin, self.zones[name])
+            for name in sorted(previous - current)
+        ] + [
+            GeofenceEvent(EVENT_ENTER, vin, self.zones[name])
+            for name in sorted(current - previous)
+        ]
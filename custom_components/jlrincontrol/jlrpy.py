@@ -2,161 +2,1251 @@
 https://github.com/ardevd/jlrpy
 """
 
-from urllib.request import Request, build_opener
+from urllib.error import HTTPError, URLError
 
+import io
 import json
+import contextlib
+import contextvars
 import datetime
-import calendar
-import uuid
-import sys
+import functools
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+import urllib.parse
 import logging
+from collections import OrderedDict
+from collections.abc import Mapping
+from types import MappingProxyType
 
+# aiohttp and the heavier standard modules (asyncio, http.client, ssl, email.utils,
+# hashlib...) are imported where they are used, so that importing jlrpy stays cheap and
+# the synchronous API never loads aiohttp
+aiohttp = None
+
+
+def _import_aiohttp():
+    """Import aiohttp on first use by the asyncio API"""
+    global aiohttp
+    if aiohttp is None:
+        try:
+            import aiohttp as module
+        except ImportError:
+            raise RuntimeError("aiohttp is required for AsyncConnection") from None
+        aiohttp = module
+    return aiohttp
+
+# Output and level are left to the application's logging configuration
 logger = logging.getLogger('jply')
-logger.setLevel(logging.INFO)
+logger.addHandler(logging.NullHandler())
 
-ch = logging.StreamHandler(sys.stdout)
-ch.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-logger.addHandler(ch)
-logger.propagate = False
+IFAS_BASE_URL = "https://jlp-ifas.wirelesscar.net/ifas/jlr"
+IFOP_BASE_URL = "https://jlp-ifop.wirelesscar.net/ifop/jlr"
+IF9_BASE_URL = "https://jlp-ifoa.wirelesscar.net/if9/jlr"
 
+# Renew the access token this many seconds before the API would reject it
+TOKEN_REFRESH_MARGIN = 120
+# Seconds a service token is reused when the authenticate response carries no lifetime
+SERVICE_TOKEN_LIFETIME = 120
+# Reverse geocode results are shared within a grid cell of this many degrees (about 11 m)
+GEOCODE_GRID = 0.0001
+GEOCODE_CACHE_SIZE = 1024
+GEOCODE_TTL = 30 * 24 * 3600
 
-class Connection(object):
-    """Connection to the JLR Remote Car API"""
+# Request priorities, lower goes first when requests wait for the rate limiter
+PRIORITY_COMMAND = 0
+PRIORITY_POLL = 1
+# Priority of the requests sent from the current thread or task
+request_priority = contextvars.ContextVar("jlrpy_request_priority", default=PRIORITY_POLL)
+# Seconds a host is left alone after a 429 without a usable Retry-After
+DEFAULT_RETRY_AFTER = 60
 
-    def __init__(self,
-                 email='',
-                 password='',
-                 device_id='', ):
-        """Init the connection object
 
-        The email address and password associated with your Jaguar InControl account is required.
-        """
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a host that keeps failing"""
+
+
+class RetryPolicy(object):
+    """Retries of an idempotent request after transient failures
+
+    Up to ``attempts`` tries in total, waiting a random time between zero and
+    ``base_delay * 2 ** retry`` seconds (at most ``max_delay``) before each retry.
+    """
+
+    def __init__(self, attempts=3, base_delay=1.0, max_delay=30.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, retry):
+        """Return the seconds to wait before retry number ``retry`` (counting from 0)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+NO_RETRY = RetryPolicy(attempts=1)
+
+
+class CircuitBreaker(object):
+    """Stop sending requests to a host after ``threshold`` transient failures in a row
+
+    While open, every request fails with CircuitOpenError except a single probe let
+    through once ``reset_timeout`` seconds have passed. A failed probe doubles the wait,
+    up to ``max_reset_timeout``; any answer from the host closes the circuit again.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30, max_reset_timeout=600):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.failures = 0
+        self.open_until = None
+        self._timeout = reset_timeout
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.open_until is not None
+
+    def allow(self):
+        """Raise CircuitOpenError unless a request may be sent now"""
+        with self._lock:
+            if self.open_until is None:
+                return
+            if self._probing or time.monotonic() < self.open_until:
+                raise CircuitOpenError("Circuit open, next probe in %.0f s"
+                                       % max(self.open_until - time.monotonic(), 0))
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            if self.open_until is not None:
+                logger.info("Host answers again, closing the circuit")
+            self.failures = 0
+            self.open_until = None
+            self._timeout = self.reset_timeout
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing:
+                self._probing = False
+                self._timeout = min(self._timeout * 2, self.max_reset_timeout)
+            elif self.open_until is not None or self.failures < self.threshold:
+                return
+            self.open_until = time.monotonic() + self._timeout
+            logger.warning("%d failed requests in a row, opening the circuit for %d s",
+                           self.failures, self._timeout)
+
+    def release(self):
+        """Give up a probe that ended without an answer, e.g. when cancelled"""
+        with self._lock:
+            self._probing = False
+
+
+# Requests the pool may send again after the connection dropped before the response
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD"))
+
+
+class HTTPConnectionPool(object):
+    """Thread-safe pool of keep-alive HTTP(S) connections, kept per host
+
+    Up to ``maxsize`` idle connections are kept for each host and handed to whichever
+    thread sends the next request. Connections idle for longer than ``idle_timeout``
+    seconds are closed instead of reused. A single pool can be shared by several
+    Connection objects.
+    """
+
+    def __init__(self, maxsize=4, idle_timeout=60, timeout=30, ssl_context=None):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._ssl_context = ssl_context  # the default context loads CA certs, create it on first use
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, headers=None, body=None):
+        """Send a request and return (status, reason, headers, body) of the response"""
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or "/"
+        if parts.query:
+            path = "%s?%s" % (path, parts.query)
+
+        while True:
+            conn, reused = self._get_conn(key)
+            sent = False
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                sent = True
+                resp = conn.getresponse()
+                resp_body = resp.read()
+            except (ConnectionResetError, BrokenPipeError):
+                conn.close()
+                # The server dropped an idle keep-alive connection. Resend on another one only
+                # if the request was not written yet, or is a GET: once a POST went out the
+                # command may have run, and must not run twice
+                if reused and (not sent or method in IDEMPOTENT_METHODS):
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+
+            if resp.will_close:
+                conn.close()
+            else:
+                self._put_conn(key, conn)
+            return resp.status, resp.reason, resp.headers, resp_body
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _ in conns:
+                conn.close()
+
+    def _get_conn(self, key):
+        now = time.monotonic()
+        with self._lock:
+            conns = self._idle.get(key, [])
+            while conns:
+                conn, last_used = conns.pop()
+                if now - last_used <= self.idle_timeout:
+                    return conn, True
+                conn.close()
+
+        import http.client
+        scheme, netloc = key
+        if scheme == "https":
+            if self._ssl_context is None:
+                import ssl
+                self._ssl_context = ssl.create_default_context()
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout, context=self._ssl_context), False
+        return http.client.HTTPConnection(netloc, timeout=self.timeout), False
+
+    def _put_conn(self, key, conn):
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            if len(conns) < self.maxsize:
+                conns.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+
+class TokenBucket(object):
+    """``rate`` requests per second on average, with bursts of up to ``burst`` requests"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.blocked_until = 0
+        self._updated = time.monotonic()
+
+    def delay(self, now):
+        """Return the seconds until a request may be sent"""
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        wait = max(self.blocked_until - now, 0)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, now, seconds):
+        """Send nothing for the given seconds, e.g. as told by Retry-After"""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+def _retry_after(value):
+    """Return the seconds of a Retry-After header (delta seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    import email.utils
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max((when - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0)
+
+
+class RateLimiter(object):
+    """Token buckets for the account and for every host, with prioritized waiting
+
+    A request needs a token from both buckets. Requests to the same host are let
+    through by priority (PRIORITY_COMMAND before PRIORITY_POLL), then in arrival
+    order. acquire() blocks the calling thread, async_acquire() the calling task.
+    """
+
+    # Re-check interval of requests waiting behind another one
+    queue_poll = 0.05
+
+    def __init__(self, rate=2.0, burst=20, host_rate=1.0, host_burst=10):
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self._account = TokenBucket(rate, burst)
+        self._hosts = {}
+        self._waiters = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self):
+        """Number of requests waiting for the limiter"""
+        with self._lock:
+            return sum(len(waiters) for waiters in self._waiters.values())
+
+    def waiting(self, priority):
+        """Number of requests of a priority waiting for the limiter"""
+        with self._lock:
+            return sum(1 for waiters in self._waiters.values() for waiter in waiters if waiter[0] == priority)
+
+    def _bucket(self, host):
+        bucket = self._hosts.get(host)
+        if bucket is None:
+            bucket = self._hosts[host] = TokenBucket(self.host_rate, self.host_burst)
+        return bucket
+
+    def block(self, url, seconds):
+        """Hold back every request to the host of url for the given seconds"""
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            self._bucket(host).block(time.monotonic(), seconds)
+        logger.warning("Rate limited by %s, pausing requests for %.0f s", host, seconds)
+
+    def _enqueue(self, url, priority):
+        host = urllib.parse.urlsplit(url).netloc
+        if priority is None:
+            priority = request_priority.get()
+        ticket = (priority, next(self._counter))
+        with self._lock:
+            heapq.heappush(self._waiters.setdefault(host, []), ticket)
+        return host, ticket
+
+    def _dequeue(self, host, ticket):
+        with self._lock:
+            waiters = self._waiters.get(host, [])
+            if ticket in waiters:
+                waiters.remove(ticket)
+                heapq.heapify(waiters)
+
+    def _try_acquire(self, host, ticket):
+        """Take the tokens and return 0, or return the seconds to wait before trying again"""
+        with self._lock:
+            buckets = (self._account, self._bucket(host))
+            now = time.monotonic()
+            delay = max(bucket.delay(now) for bucket in buckets)
+            waiters = self._waiters[host]
+            if waiters[0] != ticket:
+                return max(delay, self.queue_poll)
+            if delay > 0:
+                return delay
+            heapq.heappop(waiters)
+            for bucket in buckets:
+                bucket.take()
+            return 0
+
+    def acquire(self, url, priority=None):
+        """Wait until a request to url may be sent"""
+        host, ticket = self._enqueue(url, priority)
+        try:
+            while True:
+                delay = self._try_acquire(host, ticket)
+                if not delay:
+                    return
+                time.sleep(delay)
+        finally:
+            self._dequeue(host, ticket)
+
+    async def async_acquire(self, url, priority=None):
+        """Wait until a request to url may be sent, without blocking the event loop"""
+        import asyncio
+        host, ticket = self._enqueue(url, priority)
+        try:
+            while True:
+                delay = self._try_acquire(host, ticket)
+                if not delay:
+                    return
+                await asyncio.sleep(delay)
+        finally:
+            self._dequeue(host, ticket)
+
+
+class _ConnectionBase(object):
+    """State and request building shared by the sync and asyncio connections"""
+
+    def __init__(self, email='', password='', device_id=''):
         self.email = email
 
         if device_id:
             self.device_id = device_id
         else:
+            import uuid
             self.device_id = str(uuid.uuid4())
 
         self.oauth = {
             "grant_type": "password",
             "username": email,
             "password": password}
-        self.expiration = 0  # force credential refresh
+        self.expiration = 0  # force credential refresh, compared against time.monotonic()
+        self.expires_at = 0  # wall clock expiry, only used to persist the tokens
+        self.access_token = None
+        self.auth_token = None
+        self.refresh_token = None
+        self.user_id = None
+        self.head = {}
+        # Called without arguments whenever tokens, user id or vehicle list change
+        self.state_listener = None
+        # Replace (or share between connections of one account) to tune the limits
+        self.rate_limiter = RateLimiter()
+        # Retries of GET requests, per endpoint name or the default. The name is the command
+        # ("status", "position", ...) unless it carries parameters: those are named "trips",
+        # "trip_route", "services", "users", "geocode" and "authenticate"
+        self.retry_policy = RetryPolicy()
+        self.retry_policies = {}
+        self._circuit_breakers = {}
+        # Shared by every lookup of the connection, replace it to persist or tune the grid
+        self.geocode_cache = GeocodeCache()
+
+    def _is_expired(self):
+        return time.monotonic() > self.expiration - TOKEN_REFRESH_MARGIN
+
+    def _register_auth(self, auth):
+        self.access_token = auth['access_token']
+        self.expiration = time.monotonic() + int(auth['expires_in'])
+        self.expires_at = time.time() + int(auth['expires_in'])
+        self.auth_token = auth['authorization_token']
+        self.refresh_token = auth.get('refresh_token', self.refresh_token)
+
+    def _make_vehicle(self, data):
+        raise NotImplementedError
+
+    def circuit_breaker(self, url):
+        """Return the circuit breaker of the host of url"""
+        host = urllib.parse.urlsplit(url).netloc
+        breaker = self._circuit_breakers.get(host)
+        if breaker is None:
+            breaker = self._circuit_breakers.setdefault(host, CircuitBreaker())
+        return breaker
+
+    def _retry_policy(self, endpoint, data):
+        """Only GETs are idempotent, nothing else is retried"""
+        if data is not None:
+            return NO_RETRY
+        return self.retry_policies.get(endpoint, self.retry_policy)
+
+    def _is_transient(self, err):
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def _circuit(self, url):
+        """Guard one request with the circuit breaker of its host"""
+        breaker = self.circuit_breaker(url)
+        breaker.allow()
+        try:
+            yield
+        except Exception as err:
+            if self._is_transient(err):
+                breaker.record_failure()
+            else:
+                # The host answered, just not with what was asked for
+                breaker.record_success()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record_success()
+
+    def _rate_limited(self, url, retry_after):
+        """Back off from the host of url after a 429 response"""
+        self.rate_limiter.block(url, _retry_after(retry_after) or DEFAULT_RETRY_AFTER)
+
+    def _loaded_vehicles(self):
+        return self.vehicles
+
+    def _state_changed(self):
+        if self.state_listener is not None:
+            self.state_listener()
+
+    def export_state(self):
+        """Return device id, tokens, user id and vehicles as a JSON serializable dict"""
+        return {
+            "device_id": self.device_id,
+            "access_token": self.access_token,
+            "authorization_token": self.auth_token,
+            "refresh_token": self.refresh_token,
+            "expires_at": self.expires_at,
+            "user_id": self.user_id,
+            "vehicles": [dict(vehicle) for vehicle in self._loaded_vehicles()]}
 
-        self.connect()
+    def restore_state(self, state):
+        """Restore a state saved with export_state() without any network I/O
 
-        self.vehicles = []
+        Expired tokens are renewed by the first request, like after connect().
+        """
+        self.device_id = state["device_id"]
+        self.access_token = state["access_token"]
+        self.auth_token = state["authorization_token"]
+        self.refresh_token = state["refresh_token"]
+        self.expires_at = state["expires_at"]
+        self.expiration = time.monotonic() + (self.expires_at - time.time())
+        self.user_id = state["user_id"]
+        self._set_header(self.access_token)
+        self.vehicles = [self._make_vehicle(v) for v in state["vehicles"]]
+
+    def _refresh_grant(self):
+        """Payload for the refresh token grant"""
+        return {
+            "grant_type": "refresh_token",
+            "refresh_token": self.refresh_token}
+
+    def _with_current_token(self, headers):
+        """Replace the bearer token in headers copied before the token was renewed"""
+        if headers and headers.get("Authorization", "").startswith("Bearer"):
+            headers = dict(headers, Authorization=self.head["Authorization"])
+        return headers
+
+    def _set_header(self, access_token):
+        """Set HTTP header fields"""
+        self.head = {
+            "Authorization": "Bearer %s" % access_token,
+            "X-Device-Id": self.device_id,
+            "Content-Type": "application/json"}
+
+    def _auth_request(self):
+        """URL and headers for the token endpoint"""
+        url = "%s/tokens" % IFAS_BASE_URL
+        auth_headers = {
+            "Authorization": "Basic YXM6YXNwYXNz",
+            "Content-Type": "application/json",
+            "X-Device-Id": self.device_id}
+        return url, auth_headers
+
+    def _register_device_request(self):
+        """URL and payload used to register the device Id"""
+        url = "%s/users/%s/clients" % (IFOP_BASE_URL, self.email)
+        data = {
+            "access_token": self.access_token,
+            "authorization_token": self.auth_token,
+            "expires_in": "86400",
+            "deviceID": self.device_id
+        }
+        return url, data
+
+    def _login_user_request(self, headers):
+        """URL and headers used to look up the user id"""
+        url = "%s/users?loginName=%s" % (IF9_BASE_URL, self.email)
+        user_login_header = headers.copy()
+        user_login_header["Accept"] = "application/vnd.wirelesscar.ngtp.if9.User-v3+json"
+        return url, user_login_header
+
+    def _vehicles_url(self):
+        return "%s/users/%s/vehicles?primaryOnly=true" % (IF9_BASE_URL, self.user_id)
+
+    def _user_info_request(self):
+        """Command, URL and headers of the user information"""
+        return self.user_id, "%s/users" % IF9_BASE_URL, self.head
+
+    def _update_user_info_request(self):
+        headers = self.head.copy()
+        headers["Content-Type"] = "application/vnd.wirelesscar.ngtp.if9.User-v3+json; charset=utf-8"
+        return self.user_id, "%s/users" % IF9_BASE_URL, headers
+
+    def _geocode_url(self, lat, lon):
+        return "%s/geocode/reverse/%f/%f" % (IF9_BASE_URL, lat, lon)
+
+
+class Connection(_ConnectionBase):
+    """Connection to the JLR Remote Car API"""
+    def __init__(self,
+                 email='',
+                 password='',
+                 device_id='',
+                 transport=None):
+        """Init the connection object
+
+        The email address and password associated with your Jaguar InControl account is required.
+        Requests are sent through ``transport``, an HTTPConnectionPool; pass one to tune the pool
+        size and idle timeout or to share keep-alive connections between accounts.
+
+        No I/O is done here: the first request logs in, and ``vehicles`` is fetched on first access
+        (or explicitly with load_vehicles()).
+        """
+        super().__init__(email, password, device_id)
+        self.transport = transport or HTTPConnectionPool()
+        self._auth_lock = threading.Lock()
+        self._vehicles = None
+
+    @property
+    def vehicles(self):
+        """Vehicles associated with the account, fetched on first access"""
+        if self._vehicles is None:
+            self.load_vehicles()
+        return self._vehicles
+
+    @vehicles.setter
+    def vehicles(self, vehicles):
+        self._vehicles = vehicles
+
+    def _loaded_vehicles(self):
+        return self._vehicles or []
+
+    def load_vehicles(self):
+        """Fetch the vehicles associated with the account, logging in if needed"""
+        if self._is_expired():
+            self._renew_auth()
+        vehicles = []
         try:
             for v in self.get_vehicles(self.head)['vehicles']:
-                self.vehicles.append(Vehicle(v, self))
+                vehicles.append(self._make_vehicle(v))
         except TypeError:
             logger.error("No vehicles associated with this account")
+        self._vehicles = vehicles
+        self._state_changed()
+        return vehicles
+
+    def _ensure_auth(self):
+        """Log in or renew the tokens before a request that needs the user id or headers"""
+        if self._is_expired():
+            self._renew_auth()
+
+    def get_user_info(self):
+        """Get user information"""
+        self._ensure_auth()
+        return self.get(*self._user_info_request(), endpoint="users")
 
-    def get(self, command, url, headers):
+    def update_user_info(self, user_info_data):
+        """Update user information"""
+        self._ensure_auth()
+        return self.post(*self._update_user_info_request(), user_info_data, endpoint="users")
+
+    def reverse_geocode(self, lat, lon):
+        """Get geocode information, from geocode_cache when the position was looked up before"""
+        result = self.geocode_cache.get(lat, lon)
+        if result is None:
+            self._ensure_auth()
+            result = self.get("en", self._geocode_url(lat, lon), self.head, endpoint="geocode")
+            self.geocode_cache.put(lat, lon, result)
+        return result
+
+    def get(self, command, url, headers, endpoint=None):
         """GET data from API"""
-        return self.post(command, url, headers, None)
+        return self.post(command, url, headers, None, endpoint)
+
+    def post(self, command, url, headers, data=None, endpoint=None):
+        """POST data to API, retrying GETs after transient failures
 
-    def post(self, command, url, headers, data=None):
-        """POST data to API"""
-        now = calendar.timegm(datetime.datetime.now().timetuple())
+        endpoint is the stable name retry_policies are looked up by, the command when omitted.
+        """
         logger.debug(url)
-        if now > self.expiration:
-            # Auth expired, reconnect
+        policy = self._retry_policy(endpoint or command, data)
+        retry = 0
+        while True:
+            if self._is_expired():
+                # Auth (about to) expire, renew the tokens
+                self._renew_auth()
+                headers = self._with_current_token(headers)
+            try:
+                return self.__open("%s/%s" % (url, command), headers=headers, data=data)
+            except Exception as err:
+                if retry + 1 >= policy.attempts or not self._is_transient(err):
+                    raise
+                delay = policy.delay(retry)
+                logger.info("Getting %s failed (%s), retrying in %.1f s", command, err, delay)
+            time.sleep(delay)
+            retry += 1
+
+    def _is_transient(self, err):
+        import http.client
+        if isinstance(err, HTTPError):
+            return err.code >= 500
+        return isinstance(err, (URLError, OSError, http.client.HTTPException))
+
+    def _renew_auth(self):
+        """Renew the tokens once, however many threads find them expired"""
+        with self._auth_lock:
+            if not self._is_expired():
+                return
+            if self.refresh_token:
+                try:
+                    self.refresh_tokens()
+                    return
+                except HTTPError as err:
+                    if err.code not in (400, 401, 403):
+                        raise
+                    logger.info("Refresh token rejected, logging in again")
             self.connect()
-        return self.__open("%s/%s" % (url, command), headers=headers, data=data)
+
+    def refresh_tokens(self):
+        """Renew the access token with the refresh token grant"""
+        auth = self.__authenticate(data=self._refresh_grant())
+        self._register_auth(auth)
+        self._set_header(auth['access_token'])
+        self.__register_device(self.head)
+        logger.info("Tokens refreshed")
+        self._state_changed()
 
     def connect(self):
         logger.info("Connecting...")
         auth = self.__authenticate(data=self.oauth)
-        self.__register_auth(auth)
+        self._register_auth(auth)
         logger.info("1/3 authenticated")
-        self.__set_header(auth['access_token'])
+        self._set_header(auth['access_token'])
         self.__register_device(self.head)
         logger.info("2/3 device id registered")
         self.__login_user(self.head)
         logger.info("3/3 user logged in, user id retrieved")
+        self._state_changed()
 
     def __open(self, url, headers=None, data=None):
-        req = Request(url, headers=headers)
         if data:
-            req.data = bytes(json.dumps(data), encoding="utf8")
-
-        opener = build_opener()
-        resp = opener.open(req)
-        charset = resp.info().get('charset', 'utf-8')
-        resp_data = resp.read().decode(charset)
+            method = "POST"
+            body = bytes(json.dumps(data), encoding="utf8")
+        else:
+            method = "GET"
+            body = None
+
+        self.rate_limiter.acquire(url)
+        with self._circuit(url):
+            status, reason, resp_headers, resp_body = self.transport.request(method, url, headers, body)
+            if status == 429:
+                self._rate_limited(url, resp_headers.get("Retry-After"))
+            if status >= 400:
+                raise HTTPError(url, status, reason, resp_headers, io.BytesIO(resp_body))
+        charset = resp_headers.get_content_charset('utf-8')
+        resp_data = resp_body.decode(charset)
         if resp_data:
             return json.loads(resp_data)
         else:
             return None
 
-    def __register_auth(self, auth):
-        self.access_token = auth['access_token']
-        now = calendar.timegm(datetime.datetime.now().timetuple())
-        self.expiration = now + int(auth['expires_in'])
-        self.auth_token = auth['authorization_token']
-        self.refresh_token = auth['refresh_token']
-
-    def __set_header(self, access_token):
-        """Set HTTP header fields"""
-        self.head = {
-            "Authorization": "Bearer %s" % access_token,
-            "X-Device-Id": self.device_id,
-            "Content-Type": "application/json"}
-
     def __authenticate(self, data=None):
         """Raw urlopen command to the auth url"""
-        url = "https://jlp-ifas.wirelesscar.net/ifas/jlr/tokens"
-        auth_headers = {
-            "Authorization": "Basic YXM6YXNwYXNz",
-            "Content-Type": "application/json",
-            "X-Device-Id": self.device_id}
-
+        url, auth_headers = self._auth_request()
         return self.__open(url, auth_headers, data)
 
     def __register_device(self, headers=None):
         """Register the device Id"""
-        url = "https://jlp-ifop.wirelesscar.net/ifop/jlr/users/%s/clients" % self.email
-        data = {
-            "access_token": self.access_token,
-            "authorization_token": self.auth_token,
-            "expires_in": "86400",
-            "deviceID": self.device_id
-        }
-
+        url, data = self._register_device_request()
         return self.__open(url, headers, data)
 
     def __login_user(self, headers=None):
         """Login the user"""
-        url = "https://jlp-ifoa.wirelesscar.net/if9/jlr/users?loginName=%s" % self.email
-        user_login_header = headers.copy()
-        user_login_header["Accept"] = "application/vnd.wirelesscar.ngtp.if9.User-v3+json"
-
+        url, user_login_header = self._login_user_request(headers)
         user_data = self.__open(url, user_login_header)
         self.user_id = user_data['userId']
         return user_data
 
     def get_vehicles(self, headers):
         """Get vehicles for user"""
-        url = "https://jlp-ifoa.wirelesscar.net/if9/jlr/users/%s/vehicles?primaryOnly=true" % self.user_id
-        return self.__open(url, headers)
+        if self._is_expired():
+            self._renew_auth()
+            headers = self._with_current_token(headers)
+        return self.__open(self._vehicles_url(), headers)
 
-    def get_user_info(self):
+    def _make_vehicle(self, data):
+        return Vehicle(data, self)
+
+
+class AsyncConnection(_ConnectionBase):
+    """Asyncio connection to the JLR Remote Car API
+
+    Every request goes through one aiohttp session, so keep-alive connections to the
+    ifas, ifop and ifoa hosts are reused instead of paying a TLS handshake per call.
+    Pass an existing ``session`` to share it with the rest of the application; a
+    session created here is owned by the connection and closed by ``close()``.
+    """
+
+    def __init__(self,
+                 email='',
+                 password='',
+                 device_id='',
+                 session=None,
+                 limit_per_host=4,
+                 keepalive_timeout=60):
+        """Init the connection object. No I/O is done until connect() is awaited"""
+        _import_aiohttp()
+        super().__init__(email, password, device_id)
+        self._session = session
+        self._owns_session = session is None
+        self._limit_per_host = limit_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._auth_lock = None
+        self.vehicles = []
+
+    @property
+    def session(self):
+        """Return the shared aiohttp session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self._limit_per_host,
+                                             keepalive_timeout=self._keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._owns_session = True
+        return self._session
+
+    async def close(self):
+        """Close the session if it was created by this connection"""
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def get(self, command, url, headers, endpoint=None):
+        """GET data from API"""
+        return await self.post(command, url, headers, None, endpoint)
+
+    async def reverse_geocode(self, lat, lon):
+        """Get geocode information, from geocode_cache when the position was looked up before"""
+        result = self.geocode_cache.get(lat, lon)
+        if result is None:
+            await self._ensure_auth()
+            result = await self.get("en", self._geocode_url(lat, lon), self.head, endpoint="geocode")
+            self.geocode_cache.put(lat, lon, result)
+        return result
+
+    async def post(self, command, url, headers, data=None, endpoint=None):
+        """POST data to API, retrying GETs after transient failures
+
+        endpoint is the stable name retry_policies are looked up by, the command when omitted.
+        """
+        logger.debug(url)
+        policy = self._retry_policy(endpoint or command, data)
+        retry = 0
+        while True:
+            if self._is_expired():
+                # Auth (about to) expire, renew the tokens
+                await self._renew_auth()
+                headers = self._with_current_token(headers)
+            try:
+                return await self._open("%s/%s" % (url, command), headers=headers, data=data)
+            except Exception as err:
+                if retry + 1 >= policy.attempts or not self._is_transient(err):
+                    raise
+                delay = policy.delay(retry)
+                logger.info("Getting %s failed (%s), retrying in %.1f s", command, err, delay)
+            import asyncio
+            await asyncio.sleep(delay)
+            retry += 1
+
+    def _is_transient(self, err):
+        import asyncio
+        if isinstance(err, aiohttp.ClientResponseError):
+            return err.status >= 500
+        return isinstance(err, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+    async def _renew_auth(self):
+        """Renew the tokens once, however many tasks find them expired"""
+        if self._auth_lock is None:
+            import asyncio
+            self._auth_lock = asyncio.Lock()
+        async with self._auth_lock:
+            if not self._is_expired():
+                return
+            if self.refresh_token:
+                try:
+                    await self.refresh_tokens()
+                    return
+                except aiohttp.ClientResponseError as err:
+                    if err.status not in (400, 401, 403):
+                        raise
+                    logger.info("Refresh token rejected, logging in again")
+            await self.connect()
+
+    async def refresh_tokens(self):
+        """Renew the access token with the refresh token grant"""
+        url, auth_headers = self._auth_request()
+        auth = await self._open(url, auth_headers, self._refresh_grant())
+        self._register_auth(auth)
+        self._set_header(auth['access_token'])
+        url, data = self._register_device_request()
+        await self._open(url, self.head, data)
+        logger.info("Tokens refreshed")
+        self._state_changed()
+
+    async def connect(self):
+        logger.info("Connecting...")
+        url, auth_headers = self._auth_request()
+        auth = await self._open(url, auth_headers, self.oauth)
+        self._register_auth(auth)
+        logger.info("1/3 authenticated")
+        self._set_header(auth['access_token'])
+        url, data = self._register_device_request()
+        await self._open(url, self.head, data)
+        logger.info("2/3 device id registered")
+        url, user_login_header = self._login_user_request(self.head)
+        user_data = await self._open(url, user_login_header)
+        self.user_id = user_data['userId']
+        logger.info("3/3 user logged in, user id retrieved")
+        self._state_changed()
+
+    async def _open(self, url, headers=None, data=None):
+        if data:
+            method = "POST"
+            body = bytes(json.dumps(data), encoding="utf8")
+        else:
+            method = "GET"
+            body = None
+
+        await self.rate_limiter.async_acquire(url)
+        with self._circuit(url):
+            async with self.session.request(method, url, headers=headers, data=body) as resp:
+                if resp.status == 429:
+                    self._rate_limited(url, resp.headers.get("Retry-After"))
+                resp.raise_for_status()
+                resp_data = await resp.text()
+        if resp_data:
+            return json.loads(resp_data)
+        else:
+            return None
+
+    async def get_vehicles(self, headers):
+        """Get vehicles for user"""
+        if self._is_expired():
+            await self._renew_auth()
+            headers = self._with_current_token(headers)
+        return await self._open(self._vehicles_url(), headers)
+
+    def _make_vehicle(self, data):
+        return AsyncVehicle(data, self)
+
+    async def load_vehicles(self):
+        """Fetch the vehicles associated with the account into self.vehicles"""
+        if self._is_expired():
+            await self._renew_auth()
+        self.vehicles = []
+        try:
+            for v in (await self.get_vehicles(self.head))['vehicles']:
+                self.vehicles.append(self._make_vehicle(v))
+        except TypeError:
+            logger.error("No vehicles associated with this account")
+        self._state_changed()
+        return self.vehicles
+
+    async def _ensure_auth(self):
+        """Log in or renew the tokens before a request that needs the user id or headers"""
+        if self._is_expired():
+            await self._renew_auth()
+
+    async def get_user_info(self):
         """Get user information"""
-        return self.get(self.user_id, "https://jlp-ifoa.wirelesscar.net/if9/jlr/users", self.head)
+        await self._ensure_auth()
+        return await self.get(*self._user_info_request(), endpoint="users")
 
-    def update_user_info(self, user_info_data):
+    async def update_user_info(self, user_info_data):
         """Update user information"""
-        headers = self.head.copy()
-        headers["Content-Type"] = "application/vnd.wirelesscar.ngtp.if9.User-v3+json; charset=utf-8"
-        return self.post(self.user_id, "https://jlp-ifoa.wirelesscar.net/if9/jlr/users", headers, user_info_data)
+        await self._ensure_auth()
+        return await self.post(*self._update_user_info_request(), user_info_data, endpoint="users")
 
-    def reverse_geocode(self, lat, lon):
-        """Get geocode information"""
-        return self.get("en",
-                        "https://jlp-ifoa.wirelesscar.net/if9/jlr/geocode/reverse/{0:f}/{0:f}".format(lat, lon),
-                        self.head)
+
+class ServiceTokenCache(object):
+    """Service tokens returned by users/{id}/authenticate, cached per service
+
+    PINs are never stored: entries are keyed by an HMAC of the PIN under a random
+    per-cache key, so a changed PIN misses the cache and replaces the old token.
+    """
+
+    def __init__(self, lifetime=SERVICE_TOKEN_LIFETIME):
+        self.lifetime = lifetime
+        self._key = os.urandom(32)
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def _digest(self, pin):
+        import hashlib
+        import hmac
+        return hmac.new(self._key, pin.encode("utf8"), hashlib.sha256).digest()
+
+    def get(self, service_name, pin):
+        """Return a copy of the cached token, or None if missing, expired or for another PIN"""
+        import hmac
+        with self._lock:
+            entry = self._tokens.get(service_name)
+            if entry is None:
+                return None
+            digest, token, expires = entry
+            if time.monotonic() >= expires or not hmac.compare_digest(digest, self._digest(pin)):
+                del self._tokens[service_name]
+                return None
+            return dict(token)
+
+    def put(self, service_name, pin, token):
+        """Cache a token for the service until its lifetime runs out"""
+        if not token:
+            return
+        lifetime = token.get("expiresIn", token.get("expires_in", self.lifetime))
+        with self._lock:
+            self._tokens[service_name] = (self._digest(pin), dict(token),
+                                          time.monotonic() + int(lifetime))
+
+    def invalidate(self, service_name=None):
+        """Drop the token of one service, or of all services"""
+        with self._lock:
+            if service_name is None:
+                self._tokens.clear()
+            else:
+                self._tokens.pop(service_name, None)
+
+
+class ServiceToken(dict):
+    """Service token payload of ``service_name``; ``cached`` tells whether it came from
+    the ServiceTokenCache
+    """
+
+    def __init__(self, token, cached, service_name=None):
+        super().__init__(token or {})
+        self.cached = cached
+        self.service_name = service_name
+
+
+class GeocodeCache(object):
+    """Reverse geocode results keyed by a grid cell of the position
+
+    Positions are quantized to ``grid`` degrees, so a parked vehicle reporting slightly
+    different coordinates hits the same entry. The ``maxsize`` most recently used
+    entries are kept, each for ``ttl`` seconds. With a ``path`` the cache can be loaded
+    from and saved to a JSON file; put() does not write it, call save() when convenient.
+    """
+
+    def __init__(self, path=None, grid=GEOCODE_GRID, maxsize=GEOCODE_CACHE_SIZE, ttl=GEOCODE_TTL):
+        self.path = path
+        self.grid = grid
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.dirty = False
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, lat, lon):
+        return "%d,%d" % (round(lat / self.grid), round(lon / self.grid))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, lat, lon):
+        """Return the cached result for the grid cell of lat/lon, or None"""
+        key = self._key(lat, lon)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, result = entry
+            if time.time() >= expires:
+                del self._entries[key]
+                self.dirty = True
+                return None
+            self._entries.move_to_end(key)
+            return result
+
+    def put(self, lat, lon, result):
+        """Cache a result for the grid cell of lat/lon, evicting the least recently used"""
+        if result is None:
+            return
+        key = self._key(lat, lon)
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self.dirty = True
+
+    def load(self):
+        """Read the entries saved at path, dropping expired ones"""
+        if self.path is None:
+            return
+        try:
+            with open(self.path, "r", encoding="utf8") as handle:
+                entries = json.load(handle)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as ex:
+            logger.warning("Ignoring unreadable geocode cache %s: %s", self.path, ex)
+            return
+        now = time.time()
+        with self._lock:
+            for key, expires, result in entries:
+                if expires > now:
+                    self._entries[key] = (expires, result)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        """Write the entries to path (atomically) if they changed since the last save"""
+        if self.path is None or not self.dirty:
+            return
+        now = time.time()
+        with self._lock:
+            entries = [[key, expires, result] for key, (expires, result) in self._entries.items()
+                       if expires > now]
+            self.dirty = False
+        tmp_path = "%s.tmp" % self.path
+        with open(tmp_path, "w", encoding="utf8") as handle:
+            json.dump(entries, handle)
+        os.replace(tmp_path, self.path)
+
+
+API_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+
+
+def parse_api_time(value):
+    """Parse a timestamp as used by the API, e.g. 2019-08-03T15:47:27+0000"""
+    return datetime.datetime.strptime(value, API_TIME_FORMAT)
+
+
+def format_api_time(value):
+    """Format an aware datetime as used by the API (naive datetimes are taken as UTC)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+0000")
+
+
+def _trip_start(trip):
+    start = (trip.get("tripDetails") or {}).get("startTime")
+    return parse_api_time(start) if start else None
+
+
+def _trip_boundary(trips):
+    """Return the oldest start time on a page of trips and the ids of the trips starting then"""
+    starts = [(start, trip["id"]) for start, trip in zip(map(_trip_start, trips), trips)
+              if start is not None]
+    if not starts:
+        return None, set()
+    oldest = min(start for start, _ in starts)
+    return oldest, {trip_id for start, trip_id in starts if start == oldest}
+
+
+def _next_trip_args(result, page_size):
+    """Arguments for the page of trips before this one, None when this was the last page
+
+    Trip pages are walked newest first, each page ending where the previous one started.
+    """
+    stop, trips = result
+    oldest = _trip_boundary(trips)[0]
+    if len(trips) < page_size or oldest is None or oldest == stop:
+        return None
+    return (oldest,)
+
+
+def _next_route_args(result, page_size):
+    """Arguments for the next page of a route, None when this was the last page"""
+    page, waypoints = result
+    return (page + 1,) if len(waypoints) >= page_size else None
+
+
+def _route_waypoints(result):
+    """Return the waypoints of a route page"""
+    if isinstance(result, list):
+        return result
+    return (result or {}).get("waypoints") or []
+
+
+class _InlineExecutor(object):
+    """Executor running each call on submit, used when prefetching is off"""
+
+    def submit(self, fn, *args):
+        import concurrent.futures
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as err:
+            future.set_exception(err)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+_NUMBER_RE = re.compile(r"^-?\d+(\.\d+)?$")
+
+
+def convert_status_value(value):
+    """Convert a raw status value: TRUE/FALSE to bool, numeric strings to int or float"""
+    if not isinstance(value, str):
+        return value
+    if value in ("TRUE", "FALSE"):
+        return value == "TRUE"
+    match = _NUMBER_RE.match(value)
+    if match:
+        return float(value) if match.group(1) else int(value)
+    return value
+
+
+def _status_value(response, key):
+    """Raw value of one key of a status response, without indexing the whole list
+
+    The last element wins, as in a dict built from the list. Raises KeyError if absent.
+    """
+    for element in reversed(response['vehicleStatus']):
+        if element['key'] == key:
+            return element['value']
+    raise KeyError(key)
+
+
+class VehicleStatus(Mapping):
+    """Immutable snapshot of a status response, indexed by status key
+
+    The quasi-dict ``vehicleStatus`` list is parsed once and values are converted with
+    convert_status_value, so lookups are plain dict reads. The untouched response is
+    kept in ``raw``.
+    """
+
+    __slots__ = ("raw", "_values")
+
+    def __init__(self, response):
+        self.raw = response or {}
+        self._values = MappingProxyType({
+            element["key"]: convert_status_value(element.get("value"))
+            for element in self.raw.get("vehicleStatus") or []
+            if element.get("key")})
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return "VehicleStatus(%r)" % dict(self._values)
+
+    def changed_keys(self, previous):
+        """Return the keys whose value differs from a previous snapshot (None: all keys)"""
+        if previous is None:
+            return set(self._values)
+        old = previous._values
+        missing = object()
+        return {key for key in self._values.keys() | old.keys()
+                if self._values.get(key, missing) != old.get(key, missing)}
+
+    @property
+    def last_updated(self):
+        """Time the vehicle last reported this status"""
+        return self.raw.get("lastUpdatedTime")
+
+    @property
+    def alerts(self):
+        """Active vehicle alerts"""
+        return self.raw.get("vehicleAlerts") or []
 
 
 class Vehicle(dict):
@@ -171,6 +1261,7 @@ class Vehicle(dict):
         super().__init__(data)
         self.connection = connection
         self.vin = data['vin']
+        self.service_tokens = ServiceTokenCache()
 
     def get_attributes(self):
         """Get vehicle attributes"""
@@ -180,16 +1271,24 @@ class Vehicle(dict):
         return result
 
     def get_status(self, key=None):
-        """Get vehicle status"""
+        """Get vehicle status, or the raw value of one status key
+
+        Every call with a key fetches the status again; to read several keys fetch once
+        with get_status_snapshot() and index the returned VehicleStatus.
+        """
         headers = self.connection.head.copy()
         headers["Accept"] = "application/vnd.ngtp.org.if9.healthstatus-v2+json"
         result = self.get('status', headers)
 
         if key:
-            return {d['key']: d['value'] for d in result['vehicleStatus']}[key]
-            
+            return _status_value(result, key)
+
         return result
 
+    def get_status_snapshot(self):
+        """Get vehicle status as an indexed, converted VehicleStatus"""
+        return VehicleStatus(self.get_status())
+
     def get_health_status(self):
         """Get vehicle health status"""
         headers = self.connection.head.copy()
@@ -197,9 +1296,9 @@ class Vehicle(dict):
         headers[
             "Content-Type"] = "application/vnd.wirelesscar.ngtp.if9.StartServiceConfiguration-v3+json; charset=utf-8"
 
-        vhs_data = self._authenticate_vhs()
-
-        return self.post('healthstatus', headers, vhs_data)
+        # Asks for a report rather than changing the vehicle, it must not jump ahead of commands
+        return self._authenticated_post('healthstatus', headers, self._authenticate_vhs,
+                                        priority=PRIORITY_POLL)
 
     def get_departure_timers(self):
         """Get vehicle departure timers"""
@@ -218,20 +1317,82 @@ class Vehicle(dict):
         result = self.get('subscriptionpackages', self.connection.head)
         return result
 
-    def get_trips(self, count=1000):
-        """Get the last 1000 trips associated with vehicle"""
+    def get_trips(self, count=1000, start_date=None, stop_date=None):
+        """Get the last 1000 trips associated with vehicle, optionally within a time window"""
         headers = self.connection.head.copy()
         headers["Accept"] = "application/vnd.ngtp.org.triplist-v2+json"
-        return self.get('trips?count=%d' % count, headers)
-
-    def get_trip(self, trip_id):
-        """Get info on a specific trip"""
-        return self.get('trips/%s/route?pageSize=1000&page=0' % trip_id, self.connection.head)
+        query = {"count": count}
+        if start_date is not None:
+            query["startDate"] = format_api_time(start_date)
+        if stop_date is not None:
+            query["stopDate"] = format_api_time(stop_date)
+        return self.get('trips?%s' % urllib.parse.urlencode(query), headers, endpoint="trips")
+
+    def get_trip(self, trip_id, page_size=1000, page=0):
+        """Get one page of the route of a specific trip"""
+        return self.get('trips/%s/route?pageSize=%d&page=%d' % (trip_id, page_size, page),
+                        self.connection.head, endpoint="trip_route")
+
+    def _pages(self, fetch, next_args, first_args, prefetch):
+        """Yield pages returned by fetch(*args), the args of each page derived from the previous
+
+        With prefetch the next page is requested in a worker thread while the current one is
+        consumed; without it nothing is requested before the current page is exhausted.
+        Either way at most two pages are held in memory.
+        """
+        if prefetch:
+            import concurrent.futures
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        else:
+            executor = _InlineExecutor()
+        try:
+            future = executor.submit(fetch, *first_args)
+            while future is not None:
+                page = future.result()
+                args = next_args(page)
+                future = None
+                if args is not None and prefetch:
+                    future = executor.submit(fetch, *args)
+                yield page
+                if args is not None and not prefetch:
+                    future = executor.submit(fetch, *args)
+        finally:
+            executor.shutdown(wait=False)
+
+    def iter_trips(self, start_date=None, stop_date=None, page_size=100, prefetch=False):
+        """Yield the trips started within [start_date, stop_date], newest first, a page at a time"""
+        def fetch(stop):
+            return stop, (self.get_trips(page_size, start_date, stop) or {}).get("trips") or []
+
+        # Trips on the boundary between two pages come back on both, skip them the second time
+        skip = set()
+        for _, trips in self._pages(fetch, functools.partial(_next_trip_args, page_size=page_size),
+                                    (stop_date,), prefetch):
+            for trip in trips:
+                if trip["id"] not in skip:
+                    yield trip
+            skip = _trip_boundary(trips)[1]
+
+    def iter_trip_route(self, trip_id, page_size=1000, prefetch=False):
+        """Yield the waypoints of a trip one at a time, fetching the route a page at a time"""
+        def fetch(page):
+            return page, _route_waypoints(self.get_trip(trip_id, page_size, page))
+
+        for _, waypoints in self._pages(fetch, functools.partial(_next_route_args, page_size=page_size),
+                                        (0,), prefetch):
+            for waypoint in waypoints:
+                yield waypoint
 
     def get_position(self):
         """Get current vehicle position"""
         return self.get('position', self.connection.head)
 
+    def get_service_status(self, service_id):
+        """Get the progress of a command, by the customerServiceId of its ServiceStatus"""
+        headers = self.connection.head.copy()
+        headers["Accept"] = "application/vnd.wirelesscar.ngtp.if9.ServiceStatus-v4+json"
+        return self.get('services/%s' % service_id, headers, endpoint="services")
+
     def set_attributes(self, nickname, registration_number):
         """Set vehicle nickname and registration number"""
         attributes_data = {"nickname": nickname,
@@ -242,26 +1403,20 @@ class Vehicle(dict):
         """Lock vehicle. Requires personal PIN for authentication"""
         headers = self.connection.head.copy()
         headers["Content-Type"] = "application/vnd.wirelesscar.ngtp.if9.StartServiceConfiguration-v2+json"
-        rdl_data = self.authenticate_rdl(pin)
-
-        return self.post("lock", headers, rdl_data)
+        return self._authenticated_post("lock", headers, functools.partial(self.authenticate_rdl, pin))
 
     def unlock(self, pin):
         """Unlock vehicle. Requires personal PIN for authentication"""
         headers = self.connection.head.copy()
         headers["Content-Type"] = "application/vnd.wirelesscar.ngtp.if9.StartServiceConfiguration-v2+json"
-        rdu_data = self.authenticate_rdu(pin)
-
-        return self.post("unlock", headers, rdu_data)
+        return self._authenticated_post("unlock", headers, functools.partial(self.authenticate_rdu, pin))
 
     def reset_alarm(self, pin):
         """Reset vehicle alarm"""
         headers = self.connection.head.copy()
         headers["Content-Type"] = "application/vnd.wirelesscar.ngtp.if9.StartServiceConfiguration-v3+json; charset=utf-8"
         headers["Accept"] = "application/vnd.wirelesscar.ngtp.if9.ServiceStatus-v4+json"
-        aloff_data = self.authenticate_aloff(pin)
-
-        return self.post("unlock", headers, aloff_data)
+        return self._authenticated_post("unlock", headers, functools.partial(self.authenticate_aloff, pin))
 
     def honk_blink(self):
         """Sound the horn and blink lights"""
@@ -269,8 +1424,7 @@ class Vehicle(dict):
         headers["Accept"] = "application/vnd.wirelesscar.ngtp.if9.ServiceStatus-v4+json"
         headers["Content-Type"] = "application/vnd.wirelesscar.ngtp.if9.StartServiceConfiguration-v3+json; charset=utf-8"
 
-        hblf_data = self.authenticate_hblf()
-        return self.post("honkBlink", headers, hblf_data)
+        return self._authenticated_post("honkBlink", headers, self.authenticate_hblf)
 
     def preconditioning_start(self, target_temp):
         """Start pre-conditioning for specified temperature (celsius)"""
@@ -298,110 +1452,74 @@ class Vehicle(dict):
         headers["Accept"] = "application/vnd.wirelesscar.ngtp.if9.ServiceStatus-v5+json"
         headers["Content-Type"] = "application/vnd.wirelesscar.ngtp.if9.PhevService-v1+json; charset=utf"
 
-        ecc_data = self.authenticate_ecc()
-        ecc_data['serviceParameters'] = service_parameters
-
-        return self.post("preconditioning", headers, ecc_data)
+        return self._authenticated_post("preconditioning", headers, self.authenticate_ecc,
+                                        {'serviceParameters': service_parameters})
 
     def charging_stop(self):
         """Stop charging"""
-        service_parameters = [{"key": "CHARGE_NOW_SETTING",
-                               "value": "FORCE_OFF"}]
-
-        return self._charging_profile_control("serviceParameters", service_parameters)
+        return self._charging_profile_control("serviceParameters",
+                                              [_service_parameter("CHARGE_NOW_SETTING", "FORCE_OFF")])
 
     def charging_start(self):
         """Start charging"""
-        service_parameters = [{"key": "CHARGE_NOW_SETTING",
-                               "value": "FORCE_ON"}]
-
-        return self._charging_profile_control("serviceParameters", service_parameters)
+        return self._charging_profile_control("serviceParameters",
+                                              [_service_parameter("CHARGE_NOW_SETTING", "FORCE_ON")])
 
     def set_max_soc(self, max_charge_level):
         """Set max state of charge in percentage"""
-        service_parameters = [{"key": "SET_PERMANENT_MAX_SOC",
-                               "value": max_charge_level}]
-
-        return self._charging_profile_control("serviceParameters", service_parameters)
+        return self._charging_profile_control("serviceParameters",
+                                              [_service_parameter("SET_PERMANENT_MAX_SOC", max_charge_level)])
 
     def set_one_off_max_soc(self, max_charge_level):
         """Set one off max state of charge in percentage"""
-        service_parameters = [{"key": "SET_ONE_OFF_MAX_SOC",
-                               "value": max_charge_level}]
-
-        return self._charging_profile_control("serviceParameters", service_parameters)
+        return self._charging_profile_control("serviceParameters",
+                                              [_service_parameter("SET_ONE_OFF_MAX_SOC", max_charge_level)])
 
     def add_departure_timer(self, index, year, month, day, hour, minute):
         """Add a single departure timer with the specified index"""
-        departure_timer_setting = {"timers": [
-            {"departureTime": {"hour": hour, "minute": minute},
-             "timerIndex": index, "timerTarget":
-                 {"singleDay": {"day": day, "month": month, "year": year}},
-             "timerType": {"key": "BOTHCHARGEANDPRECONDITION", "value": True}}]}
-
-        return self._charging_profile_control("departureTimerSetting", departure_timer_setting)
+        return self._charging_profile_control(
+            "departureTimerSetting", {"timers": [_single_day_timer(index, year, month, day, hour, minute)]})
 
     def add_repeated_departure_timer(self, index, schedule, hour, minute):
         """Add repeated departure timer."""
-        departure_timer_setting = {"timers": [
-            {"departureTime": {"hour": hour, "minute": minute},
-             "timerIndex": index, "timerTarget":
-                 {"repeatSchedule": schedule},
-             "timerType": {"key": "BOTHCHARGEANDPRECONDITION", "value": True}}]}
-
-        return self._charging_profile_control("departureTimerSetting", departure_timer_setting)
+        return self._charging_profile_control(
+            "departureTimerSetting", {"timers": [_repeated_timer(index, schedule, hour, minute)]})
 
     def delete_departure_timer(self, index):
         """Delete a single departure timer associated with the specified index"""
-        departure_timer_setting = {"timers": [{"timerIndex": index}]}
-
-        return self._charging_profile_control("departureTimerSetting", departure_timer_setting)
+        return self._charging_profile_control("departureTimerSetting", {"timers": [{"timerIndex": index}]})
 
     def add_charging_period(self, index, schedule, hour_from, minute_from, hour_to, minute_to):
         """Add charging period"""
-        tariff_settings = {"tariffs": [
-            {"tariffIndex": index, "tariffDefinition": {"enabled": True,
-                                                        "repeatSchedule": schedule,
-                                                        "tariffZone": [
-                                                            {"zoneName": "TARIFF_ZONE_A",
-                                                             "bandType": "PEAK",
-                                                             "endTime": {
-                                                                 "hour": hour_from,
-                                                                 "minute": minute_from}},
-                                                            {"zoneName": "TARIFF_ZONE_B",
-                                                             "bandType": "OFFPEAK",
-                                                             "endTime": {"hour": hour_to,
-                                                                         "minute": minute_to}},
-                                                            {"zoneName": "TARIFF_ZONE_C",
-                                                             "bandType": "PEAK",
-                                                             "endTime": {"hour": 0,
-                                                                         "minute": 0}}]}}]}
-
-        return self._charging_profile_control("tariffSettings", tariff_settings)
+        return self._charging_profile_control(
+            "tariffSettings", {"tariffs": [_tariff(index, schedule, hour_from, minute_from, hour_to, minute_to)]})
 
-    def _charging_profile_control(self, service_parameter_key, service_parameters):
-        """Charging profile API"""
+    def charge_profile(self):
+        """Return a ChargeProfileBuilder to change several charging settings in one request"""
+        return ChargeProfileBuilder(self)
+
+    def set_charge_profile(self, profile):
+        """Send a complete chargeProfile body, e.g. one made by ChargeProfileBuilder.build()"""
         headers = self.connection.head.copy()
         headers["Accept"] = "application/vnd.wirelesscar.ngtp.if9.ServiceStatus-v5+json"
         headers["Content-Type"] = "application/vnd.wirelesscar.ngtp.if9.PhevService-v1+json; charset=utf-8"
 
-        cp_data = self.authenticate_cp()
-        cp_data[service_parameter_key] = service_parameters
+        return self._authenticated_post("chargeProfile", headers, self.authenticate_cp, profile)
 
-        return self.post("chargeProfile", headers, cp_data)
+    def _charging_profile_control(self, service_parameter_key, service_parameters):
+        """Charging profile API"""
+        return self.set_charge_profile({service_parameter_key: service_parameters})
 
     def set_wakeup_time(self, wakeup_time):
         """Set the wakeup time for the specified time (epoch milliseconds)"""
-        swu_data = self.authenticate_swu()
-        swu_data["serviceCommand"] = "START"
-        swu_data["startTime"] = wakeup_time
-        self._swu(swu_data)
+        swu_data = {"serviceCommand": "START",
+                    "startTime": wakeup_time}
+        return self._swu(swu_data)
 
     def delete_wakeup_time(self):
         """Stop the wakeup time"""
-        swu_data = self.authenticate_swu()
-        swu_data["serviceCommand"] = "END"
-        self._swu(swu_data)
+        swu_data = {"serviceCommand": "END"}
+        return self._swu(swu_data)
 
     def _swu(self, swu_data):
         """Set the wakeup time for the specified time (epoch milliseconds)"""
@@ -409,23 +1527,23 @@ class Vehicle(dict):
         headers["Accept"] = "application/vnd.wirelesscar.ngtp.if9.ServiceStatus-v3+json"
         headers["Content-Type"] = "application/vnd.wirelesscar.ngtp.if9.StartServiceConfiguration-v3+json; charset=utf-8"
 
-        return self.post("swu", headers, swu_data)
+        return self._authenticated_post("swu", headers, self.authenticate_swu, swu_data)
 
     def enable_service_mode(self, pin, expiration_time):
         """Enable service mode. Will disable at the specified time (epoch millis)"""
-        self._prov_command(pin, expiration_time, "protectionStrategy_serviceMode")
+        return self._prov_command(pin, expiration_time, "protectionStrategy_serviceMode")
 
     def enable_transport_mode(self, pin, expiration_time):
         """Enable transport mode. Will be disabled at the specified time (epoch millis)"""
-        self._prov_command(pin, expiration_time, "protectionStrategy_transportMode")
+        return self._prov_command(pin, expiration_time, "protectionStrategy_transportMode")
 
     def enable_privacy_mode(self, pin):
         """Enable privacy mode. Will disable journey logging"""
-        self._prov_command(pin, None, "privacySwitch_on")
+        return self._prov_command(pin, None, "privacySwitch_on")
 
     def disable_privacy_mode(self, pin):
         """Disable privacy mode. Will enable journey logging"""
-        self._prov_command(pin, None, "privacySwitch_off")
+        return self._prov_command(pin, None, "privacySwitch_off")
 
     def _prov_command(self, pin, expiration_time, mode):
         """Send prov endpoint commands. Used for service/transport/privacy mode"""
@@ -434,26 +1552,19 @@ class Vehicle(dict):
         headers[
             "Content-Type"] = "application/vnd.wirelesscar.ngtp.if9.StartServiceConfiguration-v3+json; charset=utf-8"
 
-        prov_data = self.authenticate_prov(pin)
+        prov_data = {"serviceCommand": mode,
+                     "startTime": None,
+                     "endTime": expiration_time}
 
-        prov_data["serviceCommand"] = mode
-        prov_data["startTime"] = None
-        prov_data["endTime"] = expiration_time
-
-        return self.post("prov", headers, prov_data)
+        return self._authenticated_post("prov", headers, functools.partial(self.authenticate_prov, pin),
+                                        prov_data)
 
     def _authenticate_vhs(self):
         """Authenticate to vhs and get token"""
         return self._authenticate_empty_pin_protected_service("VHS")
 
     def _authenticate_empty_pin_protected_service(self, service_name):
-        data = {
-            "serviceName": service_name,
-            "pin": ""}
-        headers = self.connection.head.copy()
-        headers["Content-Type"] = "application/vnd.wirelesscar.ngtp.if9.AuthenticateRequest-v2+json; charset=utf-8"
-
-        return self.post("users/%s/authenticate" % self.connection.user_id, headers, data)
+        return self._authenticate_service(service_name, "")
 
     def authenticate_hblf(self):
         """Authenticate to hblf"""
@@ -473,13 +1584,7 @@ class Vehicle(dict):
 
     def _authenticate_vin_protected_service(self, service_name):
         """Authenticate to specified service and return associated token"""
-        data = {
-            "serviceName": "%s" % service_name,
-            "pin": "%s" % self.vin[-4:]}
-        headers = self.connection.head.copy()
-        headers["Content-Type"] = "application/vnd.wirelesscar.ngtp.if9.AuthenticateRequest-v2+json; charset=utf-8"
-
-        return self.post("users/%s/authenticate" % self.connection.user_id, headers, data)
+        return self._authenticate_service(service_name, self.vin[-4:])
 
     def authenticate_rdl(self, pin):
         """Authenticate to rdl"""
@@ -499,19 +1604,271 @@ class Vehicle(dict):
 
     def _authenticate_pin_protected_service(self, pin, service_name):
         """Authenticate to specified service with the provided PIN"""
+        return self._authenticate_service(service_name, "%s" % pin)
+
+    def _authenticate_service(self, service_name, pin):
+        """Return a ServiceToken, from the cache when a valid one is held"""
+        token = self.service_tokens.get(service_name, pin)
+        if token is not None:
+            return ServiceToken(token, cached=True, service_name=service_name)
+        token = self.post(*self._authenticate_request(service_name, pin), endpoint="authenticate")
+        self.service_tokens.put(service_name, pin, token)
+        return ServiceToken(token, cached=False, service_name=service_name)
+
+    def _authenticate_request(self, service_name, pin):
+        """Command, headers and payload of a service authentication"""
         data = {
             "serviceName": "%s" % service_name,
-            "pin": "%s" % pin}
+            "pin": pin}
         headers = self.connection.head.copy()
         headers["Content-Type"] = "application/vnd.wirelesscar.ngtp.if9.AuthenticateRequest-v2+json; charset=utf-8"
 
-        return self.post("users/%s/authenticate" % self.connection.user_id, headers, data)
+        return "users/%s/authenticate" % self.connection.user_id, headers, data
+
+    def _authenticated_post(self, command, headers, authenticate, data=None,
+                            priority=PRIORITY_COMMAND):
+        """Authenticate to a service and post the command with the returned token
 
-    def post(self, command, headers, data):
+        Both requests are sent with the given priority, a command's unless told otherwise.
+        """
+        reset = request_priority.set(priority)
+        try:
+            service_data = authenticate()
+            try:
+                return self.post(command, headers, dict(service_data, **(data or {})))
+            except HTTPError as err:
+                # A fresh token being refused will not change on retry, only a cached one may
+                # have been revoked since it was issued
+                if err.code != 401 or not getattr(service_data, "cached", False):
+                    raise
+            # The cached service token was refused, authenticate again and retry once;
+            # the tokens of the other services stay valid
+            self.service_tokens.invalidate(service_data.service_name)
+            return self.post(command, headers, dict(authenticate(), **(data or {})))
+        finally:
+            request_priority.reset(reset)
+
+    def post(self, command, headers, data, endpoint=None):
         """Utility command to post data to VHS"""
-        return self.connection.post(command, 'https://jlp-ifoa.wirelesscar.net/if9/jlr/vehicles/%s' % self.vin,
-                                    headers, data)
+        return self.connection.post(command, '%s/vehicles/%s' % (IF9_BASE_URL, self.vin),
+                                    headers, data, endpoint)
 
-    def get(self, command, headers):
+    def get(self, command, headers, endpoint=None):
         """Utility command to get vehicle data from API"""
-        return self.connection.get(command, 'https://jlp-ifoa.wirelesscar.net/if9/jlr/vehicles/%s' % self.vin, headers)
+        return self.connection.get(command, '%s/vehicles/%s' % (IF9_BASE_URL, self.vin), headers,
+                                   endpoint)
+
+
+def _service_parameter(key, value):
+    return {"key": key, "value": value}
+
+
+def _single_day_timer(index, year, month, day, hour, minute):
+    return {"departureTime": {"hour": hour, "minute": minute},
+            "timerIndex": index,
+            "timerTarget": {"singleDay": {"day": day, "month": month, "year": year}},
+            "timerType": {"key": "BOTHCHARGEANDPRECONDITION", "value": True}}
+
+
+def _repeated_timer(index, schedule, hour, minute):
+    return {"departureTime": {"hour": hour, "minute": minute},
+            "timerIndex": index,
+            "timerTarget": {"repeatSchedule": schedule},
+            "timerType": {"key": "BOTHCHARGEANDPRECONDITION", "value": True}}
+
+
+def _tariff(index, schedule, hour_from, minute_from, hour_to, minute_to):
+    return {"tariffIndex": index,
+            "tariffDefinition": {
+                "enabled": True,
+                "repeatSchedule": schedule,
+                "tariffZone": [
+                    {"zoneName": "TARIFF_ZONE_A", "bandType": "PEAK",
+                     "endTime": {"hour": hour_from, "minute": minute_from}},
+                    {"zoneName": "TARIFF_ZONE_B", "bandType": "OFFPEAK",
+                     "endTime": {"hour": hour_to, "minute": minute_to}},
+                    {"zoneName": "TARIFF_ZONE_C", "bandType": "PEAK",
+                     "endTime": {"hour": 0, "minute": 0}}]}}
+
+
+class ChargeProfileBuilder(object):
+    """Collect departure timers, charging periods and charge settings for one chargeProfile request
+
+    The methods mirror those of Vehicle but only record the change; send() authenticates
+    once and posts everything together. Conflicting changes (the same timer or tariff index
+    twice, a setting given twice) raise ValueError as soon as they are added.
+    """
+
+    def __init__(self, vehicle):
+        self.vehicle = vehicle
+        self._timers = {}
+        self._tariffs = {}
+        self._parameters = {}
+
+    def __len__(self):
+        return len(self._timers) + len(self._tariffs) + len(self._parameters)
+
+    def _add(self, entries, index, entry, kind):
+        if index in entries:
+            raise ValueError("%s %s is already changed in this profile" % (kind, index))
+        entries[index] = entry
+        return self
+
+    def _set(self, key, value):
+        if key in self._parameters and self._parameters[key] != value:
+            raise ValueError("%s is already set to %s in this profile" % (key, self._parameters[key]))
+        self._parameters[key] = value
+        return self
+
+    def add_departure_timer(self, index, year, month, day, hour, minute):
+        """Add a single departure timer with the specified index"""
+        return self._add(self._timers, index, _single_day_timer(index, year, month, day, hour, minute),
+                         "Departure timer")
+
+    def add_repeated_departure_timer(self, index, schedule, hour, minute):
+        """Add repeated departure timer"""
+        return self._add(self._timers, index, _repeated_timer(index, schedule, hour, minute), "Departure timer")
+
+    def delete_departure_timer(self, index):
+        """Delete the departure timer with the specified index"""
+        return self._add(self._timers, index, {"timerIndex": index}, "Departure timer")
+
+    def add_charging_period(self, index, schedule, hour_from, minute_from, hour_to, minute_to):
+        """Add charging period"""
+        return self._add(self._tariffs, index,
+                         _tariff(index, schedule, hour_from, minute_from, hour_to, minute_to), "Charging period")
+
+    def set_max_soc(self, max_charge_level):
+        """Set max state of charge in percentage"""
+        return self._set("SET_PERMANENT_MAX_SOC", max_charge_level)
+
+    def set_one_off_max_soc(self, max_charge_level):
+        """Set one off max state of charge in percentage"""
+        return self._set("SET_ONE_OFF_MAX_SOC", max_charge_level)
+
+    def charging_start(self):
+        """Start charging"""
+        return self._set("CHARGE_NOW_SETTING", "FORCE_ON")
+
+    def charging_stop(self):
+        """Stop charging"""
+        return self._set("CHARGE_NOW_SETTING", "FORCE_OFF")
+
+    def build(self):
+        """Return the chargeProfile body with every collected change"""
+        profile = {}
+        if self._timers:
+            profile["departureTimerSetting"] = {
+                "timers": [self._timers[index] for index in sorted(self._timers)]}
+        if self._tariffs:
+            profile["tariffSettings"] = {
+                "tariffs": [self._tariffs[index] for index in sorted(self._tariffs)]}
+        if self._parameters:
+            profile["serviceParameters"] = [_service_parameter(key, value)
+                                            for key, value in self._parameters.items()]
+        return profile
+
+    def send(self):
+        """Send the collected changes in one chargeProfile request"""
+        if not self:
+            raise ValueError("Charge profile has no changes")
+        return self.vehicle.set_charge_profile(self.build())
+
+
+class AsyncVehicle(Vehicle):
+    """Vehicle bound to an AsyncConnection.
+
+    Shares the request building of Vehicle; every method returns an awaitable.
+    """
+
+    async def get_status(self, key=None):
+        """Get vehicle status, or the raw value of one status key
+
+        Every call with a key fetches the status again; to read several keys fetch once
+        with get_status_snapshot() and index the returned VehicleStatus.
+        """
+        headers = self.connection.head.copy()
+        headers["Accept"] = "application/vnd.ngtp.org.if9.healthstatus-v2+json"
+        result = await self.get('status', headers)
+
+        if key:
+            return _status_value(result, key)
+
+        return result
+
+    async def get_status_snapshot(self):
+        """Get vehicle status as an indexed, converted VehicleStatus"""
+        return VehicleStatus(await self.get_status())
+
+    async def _pages(self, fetch, next_args, first_args, prefetch):
+        """Yield pages returned by fetch(*args), the args of each page derived from the previous
+
+        With prefetch the next page is requested in a task while the current one is consumed.
+        """
+        task = None
+        try:
+            page = await fetch(*first_args)
+            while True:
+                args = next_args(page)
+                if args is not None and prefetch:
+                    import asyncio
+                    task = asyncio.ensure_future(fetch(*args))
+                yield page
+                if args is None:
+                    return
+                page = await (task if task is not None else fetch(*args))
+                task = None
+        finally:
+            if task is not None:
+                task.cancel()
+
+    async def iter_trips(self, start_date=None, stop_date=None, page_size=100, prefetch=False):
+        """Yield the trips started within [start_date, stop_date], newest first, a page at a time"""
+        async def fetch(stop):
+            return stop, (await self.get_trips(page_size, start_date, stop) or {}).get("trips") or []
+
+        skip = set()
+        async for _, trips in self._pages(fetch, functools.partial(_next_trip_args, page_size=page_size),
+                                          (stop_date,), prefetch):
+            for trip in trips:
+                if trip["id"] not in skip:
+                    yield trip
+            skip = _trip_boundary(trips)[1]
+
+    async def iter_trip_route(self, trip_id, page_size=1000, prefetch=False):
+        """Yield the waypoints of a trip one at a time, fetching the route a page at a time"""
+        async def fetch(page):
+            return page, _route_waypoints(await self.get_trip(trip_id, page_size, page))
+
+        async for _, waypoints in self._pages(fetch, functools.partial(_next_route_args, page_size=page_size),
+                                              (0,), prefetch):
+            for waypoint in waypoints:
+                yield waypoint
+
+    async def _authenticate_service(self, service_name, pin):
+        """Return a ServiceToken, from the cache when a valid one is held"""
+        token = self.service_tokens.get(service_name, pin)
+        if token is not None:
+            return ServiceToken(token, cached=True, service_name=service_name)
+        token = await self.post(*self._authenticate_request(service_name, pin),
+                                endpoint="authenticate")
+        self.service_tokens.put(service_name, pin, token)
+        return ServiceToken(token, cached=False, service_name=service_name)
+
+    async def _authenticated_post(self, command, headers, authenticate, data=None,
+                                  priority=PRIORITY_COMMAND):
+        """Authenticate to a service and post the command with the returned token"""
+        reset = request_priority.set(priority)
+        try:
+            service_data = await authenticate()
+            try:
+                return await self.post(command, headers, dict(service_data, **(data or {})))
+            except aiohttp.ClientResponseError as err:
+                if err.status != 401 or not getattr(service_data, "cached", False):
+                    raise
+            # The cached service token was refused, authenticate again and retry once;
+            # the tokens of the other services stay valid
+            self.service_tokens.invalidate(service_data.service_name)
+            return await self.post(command, headers, dict(await authenticate(), **(data or {})))
+        finally:
+            request_priority.reset(reset)
@@ -0,0 +1,220 @@
+"""Compact trip routes: packed coordinates, simplification and encoded polylines."""
+from array import array
+import math
+import struct
+import sys
+
+from . import jlrpy
+
+EARTH_RADIUS = 6371008.8  # metres
+DEFAULT_PRECISION = 5
+HEADER = struct.Struct("<I")
+
+
+def distance(lat1, lon1, lat2, lon2):
+    """Return the great-circle distance between two positions in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    half_dphi = (phi2 - phi1) / 2
+    half_dlambda = math.radians(lon2 - lon1) / 2
+    h = (
+        math.sin(half_dphi) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(half_dlambda) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(h)))
+
+
+def _timestamp(value):
+    if not value:
+        return math.nan
+    try:
+        return jlrpy.parse_api_time(value).timestamp()
+    except ValueError:
+        return math.nan
+
+
+def _encode_value(value, out):
+    # Zigzag then 5-bit chunks, least significant first, as in Google's format
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+class Route:
+    """Waypoints of a trip as three packed float arrays (latitude, longitude, time).
+
+    A route takes 24 bytes per point instead of a dict per waypoint. time holds
+    epoch seconds, NaN when the waypoint had no timestamp.
+    """
+
+    __slots__ = ("latitude", "longitude", "time")
+
+    def __init__(self, latitude=(), longitude=(), time=None):
+        """Initialize from sequences of coordinates (and optionally times)."""
+        self.latitude = array("d", latitude)
+        self.longitude = array("d", longitude)
+        if time is None:
+            time = [math.nan] * len(self.latitude)
+        self.time = array("d", time)
+        if not len(self.latitude) == len(self.longitude) == len(self.time):
+            raise ValueError("Route columns differ in length")
+
+    @classmethod
+    def from_waypoints(cls, waypoints):
+        """Build a route from waypoints as returned by get_trip or iter_trip_route."""
+        route = cls()
+        for waypoint in waypoints:
+            position = waypoint.get("position") or waypoint
+            latitude = position.get("latitude")
+            longitude = position.get("longitude")
+            if latitude is None or longitude is None:
+                continue
+            route.latitude.append(float(latitude))
+            route.longitude.append(float(longitude))
+            route.time.append(_timestamp(waypoint.get("timestamp")))
+        return route
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a route from TripStore.route() rows (time, lat, lon, speed, heading)."""
+        route = cls()
+        for time, latitude, longitude, *_ in rows:
+            if latitude is None or longitude is None:
+                continue
+            route.latitude.append(latitude)
+            route.longitude.append(longitude)
+            route.time.append(math.nan if time is None else time)
+        return route
+
+    def __len__(self):
+        """Return the number of points."""
+        return len(self.latitude)
+
+    def __iter__(self):
+        """Iterate over (latitude, longitude, time) tuples."""
+        return zip(self.latitude, self.longitude, self.time)
+
+    def _project(self):
+        # Equirectangular projection around the mean latitude, good to well
+        # below a metre over the extent of a trip
+        if not self.latitude:
+            return [], []
+        scale = math.radians(1) * EARTH_RADIUS
+        mean = math.radians(sum(self.latitude) / len(self.latitude))
+        x_scale = scale * math.cos(mean)
+        return (
+            [lon * x_scale for lon in self.longitude],
+            [lat * scale for lat in self.latitude],
+        )
+
+    def simplify(self, tolerance):
+        """Return the route simplified with Douglas-Peucker.
+
+        Every point that is dropped lies within tolerance metres of the
+        simplified line; the first and last point are always kept.
+        """
+        count = len(self)
+        if count < 3 or tolerance <= 0:
+            return self.copy()
+
+        x, y = self._project()
+        keep = bytearray(count)
+        keep[0] = keep[-1] = 1
+        tolerance_sq = tolerance * tolerance
+        stack = [(0, count - 1)]
+        while stack:
+            first, last = stack.pop()
+            ax, ay = x[first], y[first]
+            dx, dy = x[last] - ax, y[last] - ay
+            length_sq = dx * dx + dy * dy
+            farthest, farthest_sq = 0, tolerance_sq
+            for i in range(first + 1, last):
+                px, py = x[i] - ax, y[i] - ay
+                if length_sq:
+                    t = min(max((px * dx + py * dy) / length_sq, 0.0), 1.0)
+                    px -= t * dx
+                    py -= t * dy
+                distance_sq = px * px + py * py
+                if distance_sq > farthest_sq:
+                    farthest, farthest_sq = i, distance_sq
+            if farthest:
+                keep[farthest] = 1
+                stack.append((first, farthest))
+                stack.append((farthest, last))
+
+        indices = [i for i in range(count) if keep[i]]
+        return Route(
+            (self.latitude[i] for i in indices),
+            (self.longitude[i] for i in indices),
+            (self.time[i] for i in indices),
+        )
+
+    def copy(self):
+        """Return a copy of the route."""
+        return Route(self.latitude, self.longitude, self.time)
+
+    def encode(self, precision=DEFAULT_PRECISION):
+        """Return the coordinates as an encoded polyline, as used by map libraries."""
+        factor = 10 ** precision
+        out = []
+        previous_lat = previous_lon = 0
+        for latitude, longitude in zip(self.latitude, self.longitude):
+            lat = int(round(latitude * factor))
+            lon = int(round(longitude * factor))
+            _encode_value(lat - previous_lat, out)
+            _encode_value(lon - previous_lon, out)
+            previous_lat, previous_lon = lat, lon
+        return "".join(out)
+
+    @classmethod
+    def decode(cls, polyline, precision=DEFAULT_PRECISION):
+        """Build a route (without times) from an encoded polyline."""
+        factor = 10 ** precision
+        values = []
+        value = shift = 0
+        for char in polyline:
+            chunk = ord(char) - 63
+            value |= (chunk & 0x1F) << shift
+            shift += 5
+            if chunk < 0x20:
+                values.append(~(value >> 1) if value & 1 else value >> 1)
+                value = shift = 0
+        if len(values) % 2:
+            raise ValueError("Truncated polyline")
+
+        route = cls()
+        lat = lon = 0
+        for i in range(0, len(values), 2):
+            lat += values[i]
+            lon += values[i + 1]
+            route.latitude.append(lat / factor)
+            route.longitude.append(lon / factor)
+            route.time.append(math.nan)
+        return route
+
+    def to_bytes(self):
+        """Serialize the route losslessly (little-endian doubles)."""
+        columns = [self.latitude, self.longitude, self.time]
+        if sys.byteorder != "little":
+            columns = [array("d", column) for column in columns]
+            for column in columns:
+                column.byteswap()
+        return HEADER.pack(len(self)) + b"".join(column.tobytes() for column in columns)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Deserialize a route written by to_bytes()."""
+        (count,) = HEADER.unpack_from(data)
+        size = count * 8
+        if len(data) != HEADER.size + 3 * size:
+            raise ValueError("Route data has the wrong length")
+        columns = []
+        for i in range(3):
+            column = array("d")
+            start = HEADER.size + i * size
+            column.frombytes(data[start : start + size])
+            if sys.byteorder != "little":
+                column.byteswap()
+            columns.append(column)
+        return cls(*columns)
@@ -0,0 +1,72 @@
+"""Activity-adaptive polling schedule for JLR InControl vehicles."""
+from datetime import timedelta
+
+# Status values that mean the vehicle is doing something worth following closely
+ACTIVE_STATUS = {
+    "VEHICLE_STATE_TYPE": ("KEY_ON", "ENGINE_ON", "ENGINE_ON_REMOTE_START"),
+    "EV_CHARGING_STATUS": ("CHARGING",),
+    "EV_PRECONDITION_OPERATING_STATUS": ("PRECLIM",),
+}
+
+DEFAULT_BACKOFF = 2.0
+DEFAULT_BOOST = timedelta(minutes=5)
+# Timer ticks do not fire to the microsecond, a poll this close to due counts as due
+DUE_TOLERANCE = timedelta(seconds=1)
+
+
+def is_active(status):
+    """Return True if the status shows the vehicle moving, charging or preconditioning."""
+    if not status:
+        return False
+    return any(status.get(key) in values for key, values in ACTIVE_STATUS.items())
+
+
+class VehiclePollSchedule:
+    """Poll interval of one vehicle.
+
+    The interval stays at ``fast_interval`` while the vehicle is active, while its
+    last-updated time keeps changing, and for ``boost`` after a command. Otherwise
+    it is multiplied by ``backoff`` after every poll, up to ``max_interval``.
+    """
+
+    def __init__(
+        self, fast_interval, max_interval, backoff=DEFAULT_BACKOFF, boost=DEFAULT_BOOST
+    ):
+        """Initialize the schedule; the first poll is due immediately."""
+        self.fast_interval = fast_interval
+        self.max_interval = max(max_interval, fast_interval)
+        self.backoff = backoff
+        self.boost_duration = boost
+        self.interval = fast_interval
+        self.next_poll = None
+        self.in_flight = False
+        self.missed = 0
+        self._boost_until = None
+        self._last_updated = None
+
+    def is_due(self, now):
+        """Return True if the vehicle should be polled at ``now``."""
+        return self.next_poll is None or now + DUE_TOLERANCE >= self.next_poll
+
+    def boost(self, now):
+        """Poll fast for a while, e.g. after a command was sent to the vehicle."""
+        self._boost_until = now + self.boost_duration
+        self.interval = self.fast_interval
+        self.next_poll = now
+
+    def record(self, now, status):
+        """Work out the next poll from the status of a poll started at ``now``."""
+        last_updated = status.last_updated if status is not None else None
+        changed = last_updated != self._last_updated
+        self._last_updated = last_updated
+
+        boosted = self._boost_until is not None and now < self._boost_until
+        if boosted or changed or is_active(status):
+            self.interval = self.fast_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        self.next_poll = now + self.interval
+
+    def record_failure(self, now):
+        """Keep the current interval after a failed poll started at ``now``."""
+        self.next_poll = now + self.interval
@@ -1,10 +1,18 @@
 """Support for JLR InControl sensors."""
 import logging
 
-from homeassistant.core import callback
-from homeassistant.helpers.dispatcher import async_dispatcher_connect
-
-from . import RESOURCES, SIGNAL_STATE_UPDATED, JLREntity
+from homeassistant.const import DEVICE_CLASS_TIMESTAMP
+from homeassistant.helpers.entity import Entity
+
+from . import (
+    DATA_KEY,
+    DOMAIN,
+    POLL_SENSOR,
+    QUEUE_SENSOR,
+    RESOURCES,
+    SIGNAL_VEHICLE_POLLED,
+    JLREntity,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -13,7 +21,15 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
     """Set up the JLR sensors."""
     if discovery_info is None:
         return
-    add_entities([JLRSensor(hass, *discovery_info)])
+    sensors = []
+    for vin, attr in discovery_info:
+        if attr == QUEUE_SENSOR:
+            sensors.append(JLRQueueSensor(hass))
+        elif attr == POLL_SENSOR:
+            sensors.append(JLRPollSensor(hass, vin, attr))
+        else:
+            sensors.append(JLRSensor(hass, vin, attr))
+    add_entities(sensors)
 
 
 class JLRSensor(JLREntity):
@@ -23,12 +39,11 @@ class JLRSensor(JLREntity):
     def state(self):
         """Return the state of the sensor."""
         _LOGGER.info("Updating ==========================================")
-        val = self.get_updated_info()
+        info = self.get_updated_info()
+        if not info:
+            return None
+        val = info.get(self._attribute)
         if val is None:
-            return val
-        if val:
-            val = val[self._attribute]
-        else:
             return None
 
         if self._attribute in [
@@ -61,14 +76,6 @@ class JLRSensor(JLREntity):
     def update(self):
         _LOGGER.info("Updating here xxxxxxxxxxxxx")
 
-    async def async_added_to_hass(self):
-        _LOGGER.info(
-            "CONNECTING TO DISPATCHER =============================================="
-        )
-        async_dispatcher_connect(
-            self.hass, SIGNAL_STATE_UPDATED, self._schedule_immediate_update
-        )
-
     @property
     def unit_of_measurement(self):
         """Return the unit of measurement."""
@@ -79,7 +86,79 @@ class JLRSensor(JLREntity):
         """Return the icon."""
         return RESOURCES[self._attribute][2]
 
-    @callback
-    def _schedule_immediate_update(self):
-        _LOGGER.info("IN CALLBACK HERE ==========XXXXXXXXXXXXXXXXXX===================")
-        self.async_schedule_update_ha_state(True)
+
+class JLRPollSensor(JLREntity):
+    """When the status of a vehicle was last fetched, with the poll diagnostics."""
+
+    def _signals(self):
+        """Write state after every poll of the vehicle."""
+        return [SIGNAL_VEHICLE_POLLED.format(self._vin)]
+
+    @property
+    def _entity_name(self):
+        return "last update"
+
+    @property
+    def state(self):
+        """Return when the status was last fetched successfully."""
+        fetched = self._data.fetched(self._vin, "status")
+        return fetched.isoformat() if fetched is not None else None
+
+    @property
+    def device_class(self):
+        """Return the class of this sensor."""
+        return DEVICE_CLASS_TIMESTAMP
+
+    @property
+    def icon(self):
+        """Return the icon."""
+        return "mdi:update"
+
+    @property
+    def device_state_attributes(self):
+        """Return the poll schedule of the vehicle."""
+        schedule = self._data.schedules[self._vin]
+        return {
+            "poll_interval": int(schedule.interval.total_seconds()),
+            "missed_polls": schedule.missed,
+            "stale": self._vin in self._data.stale,
+        }
+
+
+class JLRQueueSensor(Entity):
+    """Requests of the account waiting for the rate limiter."""
+
+    def __init__(self, hass):
+        """Initialize the sensor."""
+        self._data = hass.data[DATA_KEY]
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"{DOMAIN} request queue"
+
+    @property
+    def should_poll(self):
+        """Sample the queue periodically.
+
+        The queue fills and drains within a poll cycle, so a state written at the
+        end of the cycle would always be 0.
+        """
+        return True
+
+    @property
+    def state(self):
+        """Return the number of requests waiting for the rate limiter."""
+        if self._data.connection is None:
+            return None
+        return self._data.connection.rate_limiter.queue_depth
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement."""
+        return "requests"
+
+    @property
+    def icon(self):
+        """Return the icon."""
+        return "mdi:tray-full"
@@ -0,0 +1,111 @@
+"""Encrypted persistence of the JLR InControl session."""
+import base64
+import json
+import logging
+import os
+
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from homeassistant.helpers.storage import STORAGE_DIR, Store
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+STORAGE_KEY = "jlrincontrol.auth"
+SAVE_DELAY = 10
+SNAPSHOT_STORAGE_KEY = "jlrincontrol.snapshots"
+SNAPSHOT_SAVE_DELAY = 30
+GEOCODE_FILE = "jlrincontrol.geocode"
+KDF_ITERATIONS = 100000
+
+
+def geocode_cache_path(hass):
+    """Return the file the reverse geocode cache is persisted to."""
+    return hass.config.path(STORAGE_DIR, GEOCODE_FILE)
+
+
+class AuthStore:
+    """Device id, tokens, user id and vehicle list of a jlrpy connection.
+
+    The state is encrypted with a key derived from the account credentials, so
+    the tokens are not readable from .storage and a changed password simply
+    invalidates the stored session.
+    """
+
+    def __init__(self, hass, username, password):
+        """Initialize the store."""
+        self._hass = hass
+        self._secret = f"{username}:{password}".encode("utf-8")
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._salt = None
+        self._fernet = None
+
+    def _derive(self, salt):
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            iterations=KDF_ITERATIONS,
+            backend=default_backend(),
+        )
+        return Fernet(base64.urlsafe_b64encode(kdf.derive(self._secret)))
+
+    async def _async_init_key(self, salt):
+        # Key derivation is deliberately slow, keep it off the event loop
+        self._salt = salt
+        self._fernet = await self._hass.async_add_executor_job(self._derive, salt)
+
+    async def async_load(self):
+        """Return the stored connection state, or None if missing or unreadable."""
+        data = await self._store.async_load()
+        if not data:
+            await self._async_init_key(os.urandom(16))
+            return None
+
+        await self._async_init_key(base64.b64decode(data["salt"]))
+        try:
+            return json.loads(self._fernet.decrypt(data["state"].encode("ascii")))
+        except (InvalidToken, ValueError):
+            _LOGGER.info("Stored session could not be decrypted, logging in again")
+            return None
+
+    def _encrypt(self, state):
+        return {
+            "salt": base64.b64encode(self._salt).decode("ascii"),
+            "state": self._fernet.encrypt(json.dumps(state).encode("utf-8")).decode(
+                "ascii"
+            ),
+        }
+
+    async def async_save(self, state):
+        """Encrypt and store the connection state now."""
+        await self._store.async_save(self._encrypt(state))
+
+    def async_delay_save(self, state_func):
+        """Encrypt and store the state returned by state_func after SAVE_DELAY."""
+        self._store.async_delay_save(lambda: self._encrypt(state_func()), SAVE_DELAY)
+
+
+class SnapshotStore:
+    """Last datasets fetched for every vehicle, so entities can start from them.
+
+    Stored as {vin: {endpoint: {"fetched": isoformat, "data": raw response}}}.
+    """
+
+    def __init__(self, hass):
+        """Initialize the store."""
+        self._store = Store(hass, STORAGE_VERSION, SNAPSHOT_STORAGE_KEY)
+
+    async def async_load(self):
+        """Return the stored snapshots, empty if none were saved yet."""
+        return await self._store.async_load() or {}
+
+    async def async_save(self, data):
+        """Store the snapshots now."""
+        await self._store.async_save(data)
+
+    def async_delay_save(self, data_func):
+        """Store the snapshots returned by data_func after SNAPSHOT_SAVE_DELAY."""
+        self._store.async_delay_save(data_func, SNAPSHOT_SAVE_DELAY)
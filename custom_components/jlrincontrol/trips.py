@@ -0,0 +1,325 @@
+"""Local SQLite store of trip history, synced incrementally from jlrpy vehicles."""
+import asyncio
+import functools
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from . import jlrpy
+from .routes import Route
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 1000
+TRIP_PAGE_SIZE = 100
+BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trips (
+    vin TEXT NOT NULL,
+    trip_id TEXT NOT NULL,
+    start_time INTEGER,
+    end_time INTEGER,
+    distance REAL,
+    route_synced INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL,
+    PRIMARY KEY (vin, trip_id)
+);
+CREATE INDEX IF NOT EXISTS trips_by_start ON trips (vin, start_time);
+CREATE TABLE IF NOT EXISTS waypoints (
+    vin TEXT NOT NULL,
+    trip_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    time INTEGER,
+    latitude REAL,
+    longitude REAL,
+    speed REAL,
+    heading REAL,
+    PRIMARY KEY (vin, trip_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_state (
+    vin TEXT PRIMARY KEY,
+    synced_until INTEGER
+);
+"""
+
+
+def _timestamp(value):
+    """Return epoch seconds for an API timestamp, or None."""
+    if not value:
+        return None
+    try:
+        return int(jlrpy.parse_api_time(value).timestamp())
+    except ValueError:
+        return None
+
+
+def _trip_row(vin, trip):
+    details = trip.get("tripDetails") or {}
+    return (
+        vin,
+        str(trip["id"]),
+        _timestamp(details.get("startTime")),
+        _timestamp(details.get("endTime")),
+        details.get("distance"),
+        json.dumps(trip, separators=(",", ":")),
+    )
+
+
+def _waypoint_row(vin, trip_id, seq, waypoint):
+    position = waypoint.get("position") or waypoint
+    return (
+        vin,
+        trip_id,
+        seq,
+        _timestamp(waypoint.get("timestamp")),
+        position.get("latitude"),
+        position.get("longitude"),
+        position.get("speed"),
+        position.get("heading"),
+    )
+
+
+def _batches(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+async def _async_batches(iterable, size=BATCH_SIZE):
+    batch = []
+    async for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _start_date(since):
+    if since is None:
+        return None
+    return datetime.fromtimestamp(since, timezone.utc)
+
+
+class TripStore:
+    """Trips and routes of any number of vehicles, indexed by vehicle, time and trip.
+
+    sync() only asks the API for trips newer than the last completed sync and
+    pages through the route of each new trip, so history is downloaded once.
+    Trips and waypoints are streamed into the database in batches, so memory
+    stays bounded however long the history is. Queries run locally.
+    async_sync() does the same for a jlrpy.AsyncVehicle, with the database work
+    in the default executor.
+    """
+
+    def __init__(self, path=":memory:"):
+        """Open (and create if needed) the database at path."""
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._db.close()
+
+    def latest_start(self, vin):
+        """Return the start time (epoch seconds) of the newest stored trip, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MAX(start_time) FROM trips WHERE vin = ?", (vin,)
+            ).fetchone()
+        return row[0]
+
+    def add_trips(self, vin, trips):
+        """Store trips from a trip list response, return the ids that were new."""
+        rows = [_trip_row(vin, trip) for trip in trips]
+        new = []
+        with self._lock, self._db:
+            for row in rows:
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO trips "
+                    "(vin, trip_id, start_time, end_time, distance, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    row,
+                )
+                if cursor.rowcount:
+                    new.append(row[1])
+        return new
+
+    def add_route(self, vin, trip_id, waypoints, offset=0, complete=True):
+        """Store waypoints of a trip starting at sequence number offset."""
+        trip_id = str(trip_id)
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO waypoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    _waypoint_row(vin, trip_id, offset + seq, waypoint)
+                    for seq, waypoint in enumerate(waypoints)
+                ),
+            )
+            if complete:
+                self._db.execute(
+                    "UPDATE trips SET route_synced = 1 WHERE vin = ? AND trip_id = ?",
+                    (vin, trip_id),
+                )
+
+    def pending_routes(self, vin):
+        """Return the ids of stored trips whose route was not synced yet."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT trip_id FROM trips WHERE vin = ? AND route_synced = 0 "
+                "ORDER BY start_time",
+                (vin,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def synced_until(self, vin):
+        """Return the start time (epoch seconds) covered by the last completed sync."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT synced_until FROM sync_state WHERE vin = ?", (vin,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def sync_route(self, vehicle, trip_id, page_size=DEFAULT_PAGE_SIZE, prefetch=True):
+        """Download the full route of a trip, page by page."""
+        offset = 0
+        for waypoints in _batches(
+            vehicle.iter_trip_route(trip_id, page_size, prefetch=prefetch)
+        ):
+            self.add_route(vehicle.vin, trip_id, waypoints, offset, complete=False)
+            offset += len(waypoints)
+        self.add_route(vehicle.vin, trip_id, [], offset)
+        return offset
+
+    def _advance_watermark(self, vin):
+        # Only called once every trip up to the newest stored one is stored
+        newest = self.latest_start(vin)
+        if newest is not None:
+            with self._lock, self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (vin, newest)
+                )
+
+    def sync(self, vehicle, routes=True, page_size=TRIP_PAGE_SIZE, prefetch=True):
+        """Fetch trips newer than the last completed sync (and their routes).
+
+        Works with a synchronous jlrpy.Vehicle. Returns the ids of the new trips.
+        """
+        start_date = _start_date(self.synced_until(vehicle.vin))
+        new = []
+        for trips in _batches(
+            vehicle.iter_trips(start_date, page_size=page_size, prefetch=prefetch)
+        ):
+            new.extend(self.add_trips(vehicle.vin, trips))
+        self._advance_watermark(vehicle.vin)
+
+        if routes:
+            for trip_id in self.pending_routes(vehicle.vin):
+                try:
+                    self.sync_route(vehicle, trip_id, prefetch=prefetch)
+                except Exception as ex:  # keep syncing the other routes
+                    _LOGGER.warning("Could not sync route of trip %s: %s", trip_id, ex)
+        return new
+
+    async def async_sync_route(
+        self, vehicle, trip_id, page_size=DEFAULT_PAGE_SIZE, prefetch=True
+    ):
+        """Download the full route of a trip with a jlrpy.AsyncVehicle."""
+        loop = asyncio.get_running_loop()
+        offset = 0
+        async for waypoints in _async_batches(
+            vehicle.iter_trip_route(trip_id, page_size, prefetch=prefetch)
+        ):
+            await loop.run_in_executor(
+                None,
+                functools.partial(
+                    self.add_route,
+                    vehicle.vin,
+                    trip_id,
+                    waypoints,
+                    offset,
+                    complete=False,
+                ),
+            )
+            offset += len(waypoints)
+        await loop.run_in_executor(
+            None, self.add_route, vehicle.vin, trip_id, [], offset
+        )
+        return offset
+
+    async def async_sync(
+        self, vehicle, routes=True, page_size=TRIP_PAGE_SIZE, prefetch=True
+    ):
+        """Fetch trips newer than the last completed sync (and their routes).
+
+        Works with a jlrpy.AsyncVehicle; pages are fetched on the event loop and
+        stored from the executor. Returns the ids of the new trips.
+        """
+        loop = asyncio.get_running_loop()
+        since = await loop.run_in_executor(None, self.synced_until, vehicle.vin)
+        new = []
+        async for trips in _async_batches(
+            vehicle.iter_trips(
+                _start_date(since), page_size=page_size, prefetch=prefetch
+            )
+        ):
+            new.extend(
+                await loop.run_in_executor(None, self.add_trips, vehicle.vin, trips)
+            )
+        await loop.run_in_executor(None, self._advance_watermark, vehicle.vin)
+
+        if routes:
+            pending = await loop.run_in_executor(
+                None, self.pending_routes, vehicle.vin
+            )
+            for trip_id in pending:
+                try:
+                    await self.async_sync_route(vehicle, trip_id, prefetch=prefetch)
+                except Exception as ex:  # keep syncing the other routes
+                    _LOGGER.warning(
+                        "Could not sync route of trip %s: %s", trip_id, ex
+                    )
+        return new
+
+    def trips(self, vin, start=None, end=None):
+        """Return stored trips of a vehicle started within [start, end), oldest first.
+
+        start and end are aware datetimes; either may be None for an open range.
+        """
+        query = "SELECT data FROM trips WHERE vin = ?"
+        args = [vin]
+        if start is not None:
+            query += " AND start_time >= ?"
+            args.append(int(start.timestamp()))
+        if end is not None:
+            query += " AND start_time < ?"
+            args.append(int(end.timestamp()))
+        query += " ORDER BY start_time"
+        with self._lock:
+            rows = self._db.execute(query, args).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def route(self, vin, trip_id):
+        """Return the stored waypoints of a trip as (time, lat, lon, speed, heading)."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT time, latitude, longitude, speed, heading FROM waypoints "
+                "WHERE vin = ? AND trip_id = ? ORDER BY seq",
+                (vin, str(trip_id)),
+            ).fetchall()
+
+    def compact_route(self, vin, trip_id, tolerance=None):
+        """Return the stored route of a trip as a Route, simplified to tolerance metres."""
+        route = Route.from_rows(self.route(vin, trip_id))
+        return route.simplify(tolerance) if tolerance else route